@@ -146,7 +146,8 @@ export default function RecognitionCamera({ onRecognized, autoRecognize = false,
 
       let data = null;
       try {
-        const res = await axios.post("/face/recognize", { image_base64: b64 });
+        // Already cropped to the detected face: let the server skip detection
+        const res = await axios.post("/face/recognize", { image_base64: b64, cropped: true });
         data = res.data;
         setResult(data);
       } catch (e) {
@@ -21,9 +21,17 @@ if ROOT_DIR not in sys.path:
 # 2. DB CLOSE HANDLER
 # ============================================================
 try:
-    from smart_school_backend.utils.db import close_db
+    from smart_school_backend.utils.db import close_db, get_pool
+    from smart_school_backend.face_engine.workers import get_executor
+    from smart_school_backend.face_engine.frame_cache import get_frame_cache
+    from smart_school_backend.face_engine.motion import get_motion_gate
+    from smart_school_backend.face_engine.scheduler import get_frame_scheduler
 except ImportError:
-    from utils.db import close_db
+    from utils.db import close_db, get_pool
+    from face_engine.workers import get_executor
+    from face_engine.frame_cache import get_frame_cache
+    from face_engine.motion import get_motion_gate
+    from face_engine.scheduler import get_frame_scheduler
 
 # ============================================================
 # 3. FLASK CONFIG
@@ -108,6 +116,13 @@ realtime_attendance_bp = safe_import_route(
     "bp",
 )
 
+# WebSocket frame stream for kiosks (needs flask-sock)
+init_realtime_stream = safe_import_route(
+    "smart_school_backend.routes.realtime_stream",
+    "routes.realtime_stream",
+    "init_stream",
+)
+
 # ============================================================
 # 9. OPTIONAL MODULES
 # ============================================================
@@ -157,6 +172,7 @@ app.register_blueprint(recognition_bp, url_prefix="/api/face")
 # Auto systems
 app.register_blueprint(automatic_attendance_bp, url_prefix="/api/auto-attendance")
 app.register_blueprint(realtime_attendance_bp, url_prefix="/api/realtime-attendance")
+init_realtime_stream(app)
 
 # Optional
 app.register_blueprint(timetable_bp, url_prefix="/api/timetable")
@@ -172,6 +188,19 @@ def home():
         "message": "Smart School Backend Running"
     }, 200
 
+@app.route("/api/health/db-pool")
+def db_pool_stats():
+    return {"pool": get_pool().stats()}, 200
+
+@app.route("/api/health/face-workers")
+def face_worker_stats():
+    return {
+        "workers": get_executor().stats(),
+        "frame_cache": get_frame_cache().stats(),
+        "motion_gate": get_motion_gate().stats(),
+        "frame_scheduler": get_frame_scheduler().stats(),
+    }, 200
+
 # ============================================================
 # 14. AUTH DEBUG
 # ============================================================
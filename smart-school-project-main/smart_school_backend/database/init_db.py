@@ -1,11 +1,52 @@
 import sqlite3
 import os
+import json
+import numpy as np
 from werkzeug.security import generate_password_hash
 
 # Correct database directory path relative to backend
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "smart_school.db")
 
+EMBEDDING_DIM = 128
+
+
+def convert_legacy_embeddings(cur):
+    """
+    Rewrite face_embeddings rows that are not 128-d float32 BLOBs
+    (JSON text from the old realtime/automatic endpoints, or float64 bytes)
+    into the float32 BLOB format written by store_face_embedding.
+    """
+    rows = cur.execute("""
+        SELECT id, embedding FROM face_embeddings
+        WHERE typeof(embedding) != 'blob' OR length(embedding) != ?
+    """, (EMBEDDING_DIM * 4,)).fetchall()
+
+    converted = 0
+    for row_id, raw in rows:
+        try:
+            if isinstance(raw, bytes) and len(raw) == EMBEDDING_DIM * 8:
+                values = np.frombuffer(raw, dtype=np.float64)
+            else:
+                if isinstance(raw, bytes):
+                    raw = raw.decode("utf-8")
+                values = np.asarray(json.loads(raw), dtype=np.float64).reshape(-1)
+
+            if values.shape[0] != EMBEDDING_DIM:
+                raise ValueError(f"expected {EMBEDDING_DIM} values, got {values.shape[0]}")
+
+            cur.execute(
+                "UPDATE face_embeddings SET embedding = ? WHERE id = ?",
+                (values.astype(np.float32).tobytes(), row_id),
+            )
+            converted += 1
+        except Exception as e:
+            print(f"⚠ Skipping face_embeddings row {row_id}: {e}")
+
+    if converted:
+        print(f"✔ Converted {converted} legacy face embeddings to float32 BLOBs")
+
+
 def init_db():
     print("📌 Initializing Smart School Database…")
     print(f"📁 Database Path: {DB_PATH}")
@@ -70,6 +111,19 @@ def init_db():
     )
     """)
 
+    # ----------------------------------------------------
+    # EXTRA FACE TEMPLATES (more photos of an enrolled person)
+    # ----------------------------------------------------
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS face_templates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        person_id TEXT NOT NULL REFERENCES face_embeddings(person_id) ON DELETE CASCADE,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        embedding BLOB NOT NULL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_face_templates_person ON face_templates(person_id)")
+
     # ----------------------------------------------------
     # FIXED STUDENT ATTENDANCE TABLE
     # (MATCHES student_attendance.py)
@@ -140,6 +194,8 @@ def init_db():
 
     print("✔ All tables created successfully")
 
+    convert_legacy_embeddings(cur)
+
     # ----------------------------------------------------
     # Create Default Admin
     # ----------------------------------------------------
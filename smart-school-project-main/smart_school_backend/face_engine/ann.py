@@ -0,0 +1,181 @@
+# smart_school_backend/face_engine/ann.py
+
+"""
+Approximate nearest-neighbour search for large galleries (pure NumPy IVF).
+
+A k-means coarse quantizer splits the gallery into N_LISTS cells. A query
+only looks at the rows in its NPROBE closest cells and ranks those
+candidates by exact distance, so raising NPROBE trades latency for recall
+(NPROBE = N_LISTS is exact search).
+
+Centroids and row assignments are persisted next to smart_school.db
+(face_ivf.npz) so a restart does not need to re-run k-means. If the
+gallery (ids or vectors) changed since the file was written, rows are
+re-assigned to the saved centroids, which is a single matrix product.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from smart_school_backend.face_engine.matcher import sq_distances
+from smart_school_backend.utils.db import DB_DIR
+
+ANN_PATH = os.path.abspath(os.path.join(DB_DIR, "face_ivf.npz"))
+
+# Galleries smaller than this are searched exactly
+ANN_MIN_GALLERY = int(os.environ.get("FACE_ANN_MIN_GALLERY", 20000))
+# Cells to probe per query: higher = better recall, slower
+NPROBE = int(os.environ.get("FACE_ANN_NPROBE", 8))
+KMEANS_ITERATIONS = 15
+KMEANS_SAMPLE = 50000
+
+
+def default_n_lists(n):
+    return max(1, min(4096, int(4 * np.sqrt(n))))
+
+
+def gallery_fingerprint(person_ids, matrix):
+    """Digest of ids and vectors, so a re-enrolled face invalidates saved assignments."""
+    digest = hashlib.sha1()
+    for pid in person_ids:
+        digest.update(str(pid).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+class IVFIndex:
+    def __init__(self, centroids):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    # ---------------------------------------
+    # Training / assignment
+    # ---------------------------------------
+
+    @classmethod
+    def train(cls, matrix, n_lists=None, iterations=KMEANS_ITERATIONS, seed=0):
+        """Lloyd's k-means on (a sample of) the gallery."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        n_lists = min(n_lists or default_n_lists(len(matrix)), len(matrix))
+        rng = np.random.default_rng(seed)
+
+        sample = matrix
+        if len(matrix) > KMEANS_SAMPLE:
+            sample = matrix[rng.choice(len(matrix), KMEANS_SAMPLE, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmin(sq_distances(sample, centroids), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            # Re-seed empty cells from random points so every list stays useful
+            if empty.any():
+                centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+
+        return cls(centroids)
+
+    def assign(self, vectors):
+        """Cell id for each row of an (N, 128) array."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        if len(vectors) == 0:
+            return np.empty(0, dtype=np.int32)
+        labels = np.empty(len(vectors), dtype=np.int32)
+        # Chunk to bound the (chunk, n_lists) temporary
+        for start in range(0, len(vectors), 8192):
+            chunk = vectors[start:start + 8192]
+            labels[start:start + 8192] = np.argmin(
+                sq_distances(chunk, self.centroids, self.centroid_norms), axis=1
+            )
+        return labels
+
+    # ---------------------------------------
+    # Search
+    # ---------------------------------------
+
+    def candidates(self, query, assignments, nprobe=NPROBE):
+        """Row indices of the gallery that live in the query's nprobe closest cells."""
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        nprobe = min(nprobe, self.n_lists)
+        cell_dist = sq_distances(query, self.centroids, self.centroid_norms)[0]
+        probe = np.zeros(self.n_lists, dtype=bool)
+        probe[np.argpartition(cell_dist, nprobe - 1)[:nprobe]] = True
+        return np.flatnonzero(probe[assignments])
+
+    def search(self, query, matrix, assignments, k=1, nprobe=NPROBE, matrix_norms=None):
+        """
+        Approximate top-k: probe cells, then rank candidates by exact distance.
+        Returns (row_indices, distances), both of length <= k.
+        """
+        rows = self.candidates(query, assignments, nprobe)
+        if rows.size == 0:
+            return rows, np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        norms = matrix_norms[rows] if matrix_norms is not None else None
+        sq = sq_distances(query, matrix[rows], norms)[0]
+
+        k = min(k, rows.size)
+        top = np.argpartition(sq, k - 1)[:k]
+        top = top[np.argsort(sq[top])]
+        return rows[top], np.sqrt(sq[top])
+
+    # ---------------------------------------
+    # Persistence
+    # ---------------------------------------
+
+    def save(self, path, assignments=None, fingerprint=""):
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            assignments=assignments if assignments is not None else np.empty(0, dtype=np.int32),
+            fingerprint=np.array(fingerprint),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Returns (index, assignments, fingerprint) or None if missing/unreadable."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return cls(data["centroids"]), data["assignments"], str(data["fingerprint"])
+        except Exception as e:
+            print(f"[ANN] Ignoring unreadable index file {path}: {e}")
+            return None
+
+
+def load_or_build(matrix, person_ids, path=ANN_PATH):
+    """
+    Return (IVFIndex, assignments) for the gallery, reusing the persisted
+    centroids when possible and training + saving otherwise.
+    """
+    fingerprint = gallery_fingerprint(person_ids, matrix)
+    loaded = IVFIndex.load(path)
+
+    if loaded is not None:
+        index, assignments, saved_fingerprint = loaded
+        if index.centroids.shape[1] == matrix.shape[1]:
+            if saved_fingerprint == fingerprint and len(assignments) == len(matrix):
+                return index, assignments.astype(np.int32)
+            assignments = index.assign(matrix)
+            index.save(path, assignments, fingerprint)
+            return index, assignments
+
+    index = IVFIndex.train(matrix)
+    assignments = index.assign(matrix)
+    index.save(path, assignments, fingerprint)
+    print(f"[ANN] Trained IVF index: {len(matrix)} embeddings, {index.n_lists} lists")
+    return index, assignments
@@ -0,0 +1,305 @@
+# smart_school_backend/face_engine/bulk_enroll.py
+
+"""
+Bulk face enrollment from a ZIP archive or a directory of photos.
+
+Each photo is named by the student's id_code (e.g. `ST10001.jpg`). Photos
+are encoded across a process pool (workers read the files themselves, so
+only file names cross the process boundary), checked for duplicates against
+the gallery and against each other, and written to face_embeddings in one
+transaction. The result is a report of what was enrolled and why every
+other photo was skipped.
+
+Used by scripts/bulk_enroll.py and POST /api/face/enroll-bulk.
+"""
+
+import os
+import threading
+import time
+import uuid
+import zipfile
+
+import numpy as np
+
+from smart_school_backend.face_engine.encoder import generate_embedding
+from smart_school_backend.face_engine.index import get_index
+from smart_school_backend.face_engine.matcher import sq_distances
+from smart_school_backend.face_engine.quality import FaceQualityError
+from smart_school_backend.face_engine.workers import init_worker, worker_context
+from smart_school_backend.utils.db import DB_PATH, connect
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+DUPLICATE_THRESHOLD = 0.6
+DEDUP_BLOCK = 1024
+
+UPSERT_SQL = """
+    INSERT INTO face_embeddings (role, person_id, name, email, class_name, section, embedding)
+    VALUES ('student', ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(person_id)
+    DO UPDATE SET
+        name = excluded.name,
+        email = excluded.email,
+        class_name = excluded.class_name,
+        section = excluded.section,
+        embedding = excluded.embedding
+"""
+
+
+# ---------------------------------------
+# Photo listing / worker
+# ---------------------------------------
+
+def list_photos(source):
+    """[(id_code, member)] for every image in a ZIP file or directory, sorted by name."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            members = [info.filename for info in zf.infolist() if not info.is_dir()]
+    elif os.path.isdir(source):
+        members = [
+            os.path.relpath(os.path.join(root, f), source)
+            for root, _, files in os.walk(source)
+            for f in files
+        ]
+    else:
+        raise ValueError(f"Not a ZIP file or directory: {source}")
+
+    photos = []
+    for member in sorted(members):
+        stem, ext = os.path.splitext(os.path.basename(member))
+        if ext.lower() in IMAGE_EXTENSIONS and not stem.startswith("."):
+            photos.append((stem.strip(), member))
+    return photos
+
+
+_worker_archive = None   # pool worker: the job's open ZipFile (closed when the worker exits)
+
+
+def _open_archive(source):
+    """Open `source` if it is a ZIP file; None for a directory."""
+    return zipfile.ZipFile(source) if zipfile.is_zipfile(source) else None
+
+
+def _init_worker(source):
+    """Pool initializer: load the face engine and open the archive once per worker process."""
+    global _worker_archive
+    init_worker()
+    _worker_archive = _open_archive(source)
+
+
+def _read_photo(source, member, archive):
+    if archive is None:
+        with open(os.path.join(source, member), "rb") as f:
+            return f.read()
+    return archive.read(member)
+
+
+def _encode_photo(job, archive=None):
+    """
+    Worker: (source, id_code, member) -> (id_code, member, embedding bytes | None, error).
+    encoder.generate_embedding with the "enrollment" profile (first face).
+    """
+    source, id_code, member = job
+    try:
+        data = _read_photo(source, member, archive or _worker_archive)
+    except Exception as e:
+        return id_code, member, None, f"unreadable: {e}"
+    try:
+        embedding = generate_embedding(data, "enrollment")
+    except FaceQualityError as e:
+        return id_code, member, None, e.reason
+    if embedding is None:
+        return id_code, member, None, "no_face"
+    return id_code, member, np.asarray(embedding, dtype=np.float32).tobytes(), None
+
+
+# ---------------------------------------
+# Bulk enrollment
+# ---------------------------------------
+
+def _dedup_within_batch(matrix, threshold):
+    """
+    Greedy in-batch dedup in file order: a row is dropped if it is within
+    threshold of an earlier kept row. Returns (keep mask, index of the kept
+    row each dropped row collided with, or -1).
+    """
+    n = len(matrix)
+    keep = np.ones(n, dtype=bool)
+    clash = np.full(n, -1)
+    norms = np.einsum("ij,ij->i", matrix, matrix)
+    limit = threshold * threshold
+
+    for start in range(0, n, DEDUP_BLOCK):
+        block = matrix[start:start + DEDUP_BLOCK]
+        sq = sq_distances(block, matrix, norms)
+        for offset, row in enumerate(sq):
+            i = start + offset
+            hits = np.flatnonzero((row[:i] < limit) & keep[:i])
+            if hits.size:
+                keep[i] = False
+                clash[i] = hits[0]
+    return keep, clash
+
+
+def bulk_enroll(source, db_path=DB_PATH, workers=None, threshold=DUPLICATE_THRESHOLD,
+                progress=None, dry_run=False):
+    """
+    Enroll every photo in `source` (ZIP path or directory). `progress` is
+    called as progress(done, total) while photos are encoded. With dry_run,
+    nothing is written.
+
+    Returns a report:
+    {
+      "total": 5000, "enrolled": 4890, "updated": 40, "skipped": 70,
+      "errors": [ { "file": "ST1.jpg", "id_code": "ST1", "reason": "no_face" }, ... ],
+      "seconds": 212.4
+    }
+    """
+    started = time.monotonic()
+    photos = list_photos(source)
+    report = {"total": len(photos), "enrolled": 0, "updated": 0, "skipped": 0, "errors": []}
+
+    def skip(id_code, member, reason, **extra):
+        report["skipped"] += 1
+        report["errors"].append({"file": member, "id_code": id_code, "reason": reason, **extra})
+
+    conn = connect(db_path)
+    try:
+        students = {
+            row["id_code"]: row
+            for row in conn.execute(
+                "SELECT id, id_code, name, email, class_name, section FROM students WHERE id_code IS NOT NULL"
+            )
+        }
+
+        jobs, seen = [], set()
+        for id_code, member in photos:
+            if id_code not in students:
+                skip(id_code, member, "unknown_id_code")
+            elif id_code in seen:
+                skip(id_code, member, "duplicate_id_code")
+            else:
+                seen.add(id_code)
+                jobs.append((source, id_code, member))
+
+        # Encode across all cores
+        encoded = []
+        done = len(photos) - len(jobs)
+        if progress:
+            progress(done, len(photos))
+
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(jobs) > 1:
+            # Started from a job thread: never fork the threaded web process
+            with worker_context().Pool(workers, initializer=_init_worker, initargs=(source,)) as pool:
+                results = pool.imap_unordered(_encode_photo, jobs, chunksize=4)
+                for result in results:
+                    encoded.append(result)
+                    done += 1
+                    if progress:
+                        progress(done, len(photos))
+        else:
+            archive = _open_archive(source)
+            try:
+                for job in jobs:
+                    encoded.append(_encode_photo(job, archive))
+                    done += 1
+                    if progress:
+                        progress(done, len(photos))
+            finally:
+                if archive is not None:
+                    archive.close()
+
+        # Keep file order so dedup decisions are reproducible
+        encoded.sort(key=lambda r: r[1])
+        faces = []
+        for id_code, member, blob, error in encoded:
+            if error:
+                skip(id_code, member, error)
+            else:
+                faces.append((id_code, member, np.frombuffer(blob, dtype=np.float32)))
+
+        if not faces:
+            return report
+
+        matrix = np.stack([emb for _, _, emb in faces])
+        keep, clash = _dedup_within_batch(matrix, threshold)
+
+        index = get_index()
+        with index.lock:
+            index.ensure_loaded(conn)
+            matches = index.search_exact(matrix, threshold=threshold)
+
+            rows, accepted = [], []
+            for i, (id_code, member, emb) in enumerate(faces):
+                student = students[id_code]
+                match = matches[i]
+                if not keep[i]:
+                    skip(id_code, member, "duplicate_in_batch", same_face_as=faces[clash[i]][0])
+                elif match and match["person_id"] != str(student["id"]):
+                    skip(id_code, member, "already_enrolled",
+                         existing_person_id=match["person_id"], existing_role=match["role"])
+                else:
+                    report["updated" if match else "enrolled"] += 1
+                    rows.append((str(student["id"]), student["name"], student["email"],
+                                 student["class_name"], student["section"], emb.tobytes()))
+                    accepted.append((student, emb))
+
+            if rows and not dry_run:
+                # Single transaction for the whole import
+                with conn:
+                    conn.executemany(UPSERT_SQL, rows)
+                for student, emb in accepted:
+                    index.upsert(student["id"], "student", emb, class_name=student["class_name"],
+                                 section=student["section"], name=student["name"])
+
+        print(f"[BULK] {report['enrolled']} enrolled, {report['updated']} updated, "
+              f"{report['skipped']} skipped of {report['total']}")
+        return report
+    finally:
+        conn.close()
+        report["seconds"] = round(time.monotonic() - started, 2)
+
+
+# ---------------------------------------
+# Background jobs (admin endpoint)
+# ---------------------------------------
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def start_bulk_job(source, cleanup=False, **options):
+    """
+    Run bulk_enroll in a background thread. Returns a job id for get_job().
+    With cleanup, `source` (an uploaded temp file) is deleted afterwards.
+    """
+    job_id = uuid.uuid4().hex
+    job = {"id": job_id, "status": "running", "done": 0, "total": None, "report": None, "error": None}
+    with _jobs_lock:
+        _jobs[job_id] = job
+
+    def progress(done, total):
+        job["done"], job["total"] = done, total
+
+    def run():
+        try:
+            job["report"] = bulk_enroll(source, progress=progress, **options)
+            job["status"] = "done"
+        except Exception as e:
+            print(f"[BULK] Job {job_id} failed: {e}")
+            job["status"], job["error"] = "failed", str(e)
+        finally:
+            if cleanup:
+                try:
+                    os.remove(source)
+                except OSError:
+                    pass
+
+    threading.Thread(target=run, name=f"bulk-enroll-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    return dict(job) if job else None
@@ -1,60 +1,131 @@
-import base64
-import cv2
-import numpy as np
-import face_recognition
-from io import BytesIO
-from PIL import Image
+from smart_school_backend.face_engine.pipeline import get_pipeline
+from smart_school_backend.face_engine.quality import FaceQualityError
 
-def generate_embedding(image_base64: str):
+
+def generate_embedding(image, profile="enrollment"):
     """
-    Takes base64 image string and returns a 128-d face embedding (np.ndarray)
+    Takes an image (base64 string, raw bytes or file stream) and returns a
+    128-d face embedding (np.ndarray) for the first detected face.
+    `profile` selects the resize/detector settings in pipeline.PIPELINE_PROFILES.
     Returns None if no face is detected or an error occurs.
+    Raises FaceQualityError (with .reason) if the face fails the quality gate.
     """
-    print("Encoder: 1. Processing image string")
+    print("Encoder: 1. Processing image")
     try:
-        if "," in image_base64:
-            image_base64 = image_base64.split(",")[1]
-
-        print("Encoder: 2. Decoding base64")
-        image_bytes = base64.b64decode(image_base64)
-        
-        print("Encoder: 3. Opening image with PIL")
-        image = Image.open(BytesIO(image_bytes)).convert("RGB")
-        print(f"Encoder: Original image size: {image.width}x{image.height}")
-
-        max_size = 800
-        if image.width > max_size or image.height > max_size:
-            ratio = max_size / max(image.width, image.height)
-            new_width = int(image.width * ratio)
-            new_height = int(image.height * ratio)
-
-            if new_width == 0 or new_height == 0:
-                print(f"Error: Invalid resize dimensions calculated ({new_width}x{new_height}). Skipping face recognition.")
-                return None
-
-            print(f"Encoder: Resizing to {new_width}x{new_height}")
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        image_np = np.array(image)
-        
-        print("Encoder: 4. Detecting face locations")
-        face_locations = face_recognition.face_locations(image_np)
-        print(f"Encoder: 5. Found {len(face_locations)} face(s)")
+        pipeline = get_pipeline(profile)
+
+        print("Encoder: 2. Decoding image")
+        image_np, scale, (height, width) = pipeline.prepare(image)
+        print(f"Encoder: Original image size: {width}x{height}")
+
+        print("Encoder: 3. Detecting face locations")
+        face_locations = pipeline.detect(image_np)
+        print(f"Encoder: 4. Found {len(face_locations)} face(s)")
 
         if not face_locations:
             return None
 
+        print("Encoder: 5. Checking face quality")
+        quality = pipeline.check(image_np, face_locations[:1], scale)[0]
+        if not quality.ok:
+            print(f"Encoder: Face rejected ({quality.reason}) {quality.scores}")
+            raise FaceQualityError(quality)
+
         print("Encoder: 6. Generating face encodings")
-        encodings = face_recognition.face_encodings(image_np, face_locations)
+        encodings = pipeline.encode(image_np, face_locations[:1])
 
         if not encodings:
             print("Encoder: 7. No encodings generated")
             return None
-        
+
         print("Encoder: 8. Returning first encoding")
-        return encodings[0].astype(np.float32)
+        return encodings[0]
 
+    except FaceQualityError:
+        raise
     except Exception as e:
         # Log the error silently for debugging, without crashing
         print(f"Error in generate_embedding: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def generate_embedding_from_crop(image, face_box=None, profile="recognition"):
+    """
+    Fast path for a face the client already detected and cropped: skips
+    detection and encodes the supplied location directly. `face_box` is
+    (top, right, bottom, left) in the uploaded image; None = whole image.
+    Returns the embedding, or None on error.
+    Raises FaceQualityError if the face fails the quality gate.
+    """
+    try:
+        pipeline = get_pipeline(profile)
+        image_np, scale, _ = pipeline.prepare(image)
+        location = pipeline.locate(image_np, scale, face_box)
+
+        quality = pipeline.check(image_np, [location], scale)[0]
+        if not quality.ok:
+            raise FaceQualityError(quality)
+
+        encodings = pipeline.encode(image_np, [location])
+        return encodings[0] if encodings else None
+
+    except FaceQualityError:
+        raise
+    except Exception as e:
+        print(f"Error in generate_embedding_from_crop: {e}")
+        return None
+
+
+def process_frame(image, profile="realtime"):
+    """FacePipeline.process for a profile, as a module-level task for the recognition executor."""
+    return get_pipeline(profile).process(image)
+
+
+def detect_faces(image, profile="realtime"):
+    """Decode, downscale and detect. Returns (image_np, scale, (height, width), locations)."""
+    pipeline = get_pipeline(profile)
+    image_np, scale, dimensions = pipeline.prepare(image)
+    return image_np, scale, dimensions, pipeline.detect(image_np)
+
+
+def encode_faces(image, locations, scale, profile="realtime"):
+    """
+    Quality-check and encode faces found by detect_faces. `image` is the
+    prepared array from detect_faces or the original frame (prepared again;
+    detection is not repeated). Returns (quality results, encodings of the
+    faces that passed, in order).
+    """
+    pipeline = get_pipeline(profile)
+    image_np, _, _ = pipeline.prepare(image)
+    quality = pipeline.check(image_np, locations, scale)
+    accepted = [box for box, result in zip(locations, quality) if result.ok]
+    return quality, pipeline.encode(image_np, accepted)
+
+
+def generate_embeddings_batch(images, profile="recognition"):
+    """
+    Takes a list of frames (base64 strings, raw bytes or streams) and returns, per frame,
+    a list of {"box": (top, right, bottom, left), "embedding": np.ndarray}.
+    Faces rejected by the quality gate have "embedding": None and a "quality" reason.
+    Frames that fail to decode or contain no face yield an empty list.
+    """
+    pipeline = get_pipeline(profile)
+
+    results = []
+    for image in images:
+        try:
+            frame = pipeline.process(image)
+            faces = [
+                {"box": box, "embedding": enc}
+                for box, enc in zip(frame["face_locations"], frame["face_encodings"])
+            ]
+            faces += [
+                {"box": face["box"], "embedding": None, "quality": face["reason"]}
+                for face in frame["rejected_faces"]
+            ]
+            results.append(faces)
+        except Exception as e:
+            print(f"Error in generate_embeddings_batch: {e}")
+            results.append([])
+
+    return results
@@ -0,0 +1,123 @@
+# smart_school_backend/face_engine/frame_cache.py
+
+"""
+Short-lived cache of pipeline results keyed by a perceptual frame hash.
+
+Kiosks send near-identical frames back-to-back (an empty corridor, or the
+same student standing still). Hashing a tiny greyscale thumbnail costs
+well under a millisecond (JPEGs are decoded at 1/8 scale), so a frame whose
+hash is within MAX_HAMMING bits of a recent frame from the same client
+reuses that frame's detection / encoding result instead of running HOG
+and the encoder again.
+
+The hash is a difference hash: the frame is shrunk to (HASH_SIZE + 1) x
+HASH_SIZE grey pixels and each bit says whether a pixel is brighter than its
+right neighbour. Lighting drift and JPEG noise flip few bits; a person
+stepping into view flips many.
+
+Entries live for TTL seconds and each client keeps its PER_CLIENT most
+recent hashes; clients are evicted least-recently-used beyond MAX_CLIENTS.
+Only pipeline outputs are cached (boxes, embeddings, quality verdicts);
+matching against the index always runs, so enrollments take effect at once.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from smart_school_backend.face_engine.pipeline import open_preview
+
+ENABLED = os.environ.get("FACE_FRAME_CACHE", "1").lower() not in ("0", "false", "no")
+TTL = float(os.environ.get("FACE_FRAME_CACHE_TTL", 3.0))             # seconds
+MAX_HAMMING = int(os.environ.get("FACE_FRAME_CACHE_HAMMING", 6))      # of HASH_SIZE ** 2 bits
+HASH_SIZE = 16
+PER_CLIENT = 4
+MAX_CLIENTS = 512
+
+
+def frame_hash(image):
+    """
+    (difference hash as int, (width, height)) for a frame given as bytes,
+    a base64 string or a seekable stream. Streams are rewound afterwards.
+    """
+    pil_image, size = open_preview(image, HASH_SIZE * 8)
+    thumb = np.asarray(
+        pil_image.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR), dtype=np.int16
+    )
+    bits = np.packbits(thumb[:, 1:] > thumb[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big"), size
+
+
+class FrameCache:
+    def __init__(self, ttl=TTL, max_hamming=MAX_HAMMING, per_client=PER_CLIENT, max_clients=MAX_CLIENTS,
+                 enabled=ENABLED):
+        self.ttl = ttl
+        self.max_hamming = max_hamming
+        self.per_client = per_client
+        self.max_clients = max_clients
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()    # key -> [(hash, size, expires, value)], newest first
+        self._stats = {"hits": 0, "misses": 0}
+
+    def fingerprint(self, image):
+        """Hash for lookup()/store(), or None if caching is off or the frame can't be decoded."""
+        if not self.enabled:
+            return None
+        try:
+            return frame_hash(image)
+        except Exception:
+            return None
+
+    def lookup(self, key, fingerprint):
+        """(True, value) for the newest live entry of `key` close to fingerprint, else (False, None)."""
+        if fingerprint is None:
+            return False, None
+        frame_bits, size = fingerprint
+        now = time.monotonic()
+        with self._lock:
+            entries = self._clients.get(key)
+            if entries:
+                entries[:] = [e for e in entries if e[2] > now]
+                for bits, entry_size, _, value in entries:
+                    if entry_size == size and bin(bits ^ frame_bits).count("1") <= self.max_hamming:
+                        self._clients.move_to_end(key)
+                        self._stats["hits"] += 1
+                        return True, value
+            self._stats["misses"] += 1
+            return False, None
+
+    def store(self, key, fingerprint, value):
+        if fingerprint is None:
+            return
+        frame_bits, size = fingerprint
+        with self._lock:
+            entries = self._clients.setdefault(key, [])
+            entries.insert(0, (frame_bits, size, time.monotonic() + self.ttl, value))
+            del entries[self.per_client:]
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / total, 3) if total else 0.0,
+                "clients": len(self._clients),
+                "enabled": self.enabled,
+            }
+
+
+_cache = FrameCache()
+
+
+def get_frame_cache() -> FrameCache:
+    """Return the process-wide frame cache."""
+    return _cache
@@ -0,0 +1,424 @@
+# smart_school_backend/face_engine/index.py
+
+"""
+Process-wide in-memory index of enrolled face embeddings.
+
+All embeddings live in one contiguous float32 (N, 128) matrix with parallel
+person_id / role arrays, so a recognition request is a single batched
+distance computation instead of a SQLite scan plus a Python loop.
+
+The index is loaded lazily from `face_embeddings` (one primary template per
+person) and `face_templates` (extra templates of the same person) on first
+use and kept in sync by `store_face_embedding` (upsert), `add_face_template`
+(add_template / remove_template) and the student / teacher delete routes
+(remove).
+
+Galleries of ANN_MIN_GALLERY or more rows are searched through an IVF
+coarse quantizer (face_engine/ann.py) instead of a full scan.
+
+Searches can be scoped (see face_engine/scope.py): the rows of a scope are
+partitioned out once per gallery version and searched first, and the whole
+gallery is only searched when nothing in scope clears the threshold.
+
+Match modes:
+  "min"       distance to the person's closest template (default)
+  "centroid"  distance to the mean of the person's templates
+"""
+
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from smart_school_backend.face_engine.ann import ANN_MIN_GALLERY, NPROBE, load_or_build
+from smart_school_backend.face_engine.matcher import match_batch, sq_distances
+
+EMBEDDING_DIM = 128
+
+# Per-row metadata a scope can filter on (besides role)
+LABEL_FIELDS = ("class_name", "section", "name")
+MAX_PARTITIONS = 256
+
+MATCH_MODES = ("min", "centroid")
+DEFAULT_MATCH_MODE = os.environ.get("FACE_MATCH_MODE", "min")
+
+# template_ids: 0 for the face_embeddings row, face_templates.id otherwise
+# assignments is None unless the ANN index is active
+Snapshot = namedtuple("Snapshot", "matrix norms person_ids roles labels template_ids assignments")
+# rows maps each view row back to a snapshot row
+Partition = namedtuple("Partition", "snapshot rows matrix norms")
+
+LOAD_QUERY = """
+    SELECT person_id, role, class_name, section, name, 0, embedding
+    FROM face_embeddings
+"""
+LOAD_TEMPLATES_QUERY = """
+    SELECT ft.person_id, fe.role, fe.class_name, fe.section, fe.name, ft.id, ft.embedding
+    FROM face_templates ft
+    JOIN face_embeddings fe ON fe.person_id = ft.person_id
+"""
+
+
+class EmbeddingIndex:
+    def __init__(self, use_ann=None):
+        """use_ann: True / False to force, None to enable at ANN_MIN_GALLERY rows."""
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.use_ann = use_ann
+        self._ann = None
+        self._partitions = {}
+        self._set_arrays(
+            np.empty((0, EMBEDDING_DIM), dtype=np.float32),
+            np.empty(0, dtype=object),
+            np.empty(0, dtype=object),
+            {field: np.empty(0, dtype=object) for field in LABEL_FIELDS},
+            np.empty(0, dtype=np.int64),
+        )
+
+    @property
+    def lock(self):
+        """Writer lock; hold it to make a search + store sequence atomic."""
+        return self._lock
+
+    def _set_arrays(self, matrix, person_ids, roles, labels, template_ids, assignments=None):
+        # Readers grab this snapshot once and never see a half-updated index.
+        norms = np.einsum("ij,ij->i", matrix, matrix)
+        self._snapshot = Snapshot(matrix, norms, person_ids, roles, labels, template_ids, assignments)
+        self._partitions = {}
+
+    # ---------------------------------------
+    # Loading / invalidation
+    # ---------------------------------------
+
+    def load(self, conn):
+        """(Re)build the index from face_embeddings and face_templates."""
+        rows = conn.execute(LOAD_QUERY).fetchall()
+        try:
+            rows += conn.execute(LOAD_TEMPLATES_QUERY).fetchall()
+        except sqlite3.OperationalError:
+            # Database created before face_templates existed
+            pass
+
+        matrix = np.empty((len(rows), EMBEDDING_DIM), dtype=np.float32)
+        person_ids = np.empty(len(rows), dtype=object)
+        roles = np.empty(len(rows), dtype=object)
+        labels = {field: np.empty(len(rows), dtype=object) for field in LABEL_FIELDS}
+        template_ids = np.empty(len(rows), dtype=np.int64)
+
+        count = 0
+        for person_id, role, class_name, section, name, template_id, blob in rows:
+            emb = np.frombuffer(blob, dtype=np.float32)
+            if emb.shape[0] != EMBEDDING_DIM:
+                print(f"[INDEX] Skipping malformed embedding for person_id={person_id}")
+                continue
+            matrix[count] = emb
+            person_ids[count] = str(person_id)
+            roles[count] = role
+            labels["class_name"][count] = class_name
+            labels["section"][count] = section
+            labels["name"][count] = name
+            template_ids[count] = template_id
+            count += 1
+
+        matrix, person_ids, roles = matrix[:count], person_ids[:count], roles[:count]
+        labels = {field: values[:count] for field, values in labels.items()}
+        template_ids = template_ids[:count]
+
+        ann, assignments = None, None
+        if self.use_ann or (self.use_ann is None and count >= ANN_MIN_GALLERY):
+            ann, assignments = load_or_build(matrix, person_ids)
+
+        with self._lock:
+            self._ann = ann
+            self._set_arrays(matrix, person_ids, roles, labels, template_ids, assignments)
+            self._loaded = True
+
+        print(f"[INDEX] Loaded {count} face embeddings" + (f" (IVF, {ann.n_lists} lists)" if ann else ""))
+
+    def ensure_loaded(self, conn):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load(conn)
+
+    def invalidate(self):
+        """Drop the cached matrix; the next ensure_loaded() reloads from DB."""
+        with self._lock:
+            self._loaded = False
+
+    # ---------------------------------------
+    # Incremental updates
+    # ---------------------------------------
+
+    def _append(self, emb, person_id, role, values, template_id):
+        """Add one row to the snapshot. Caller holds self._lock."""
+        matrix, _, person_ids, roles, labels, template_ids, assignments = self._snapshot
+        if self._ann is not None:
+            assignments = np.append(assignments, self._ann.assign(emb))
+
+        self._set_arrays(
+            np.vstack([matrix, emb]),
+            np.append(person_ids, np.array([person_id], dtype=object)),
+            np.append(roles, np.array([role], dtype=object)),
+            {
+                field: np.append(column, np.array([values[field]], dtype=object))
+                for field, column in labels.items()
+            },
+            np.append(template_ids, template_id),
+            assignments,
+        )
+
+    def _drop(self, drop):
+        """Remove the rows of boolean mask `drop`. Caller holds self._lock."""
+        matrix, _, person_ids, roles, labels, template_ids, assignments = self._snapshot
+        keep = ~drop
+        self._set_arrays(
+            matrix[keep], person_ids[keep], roles[keep],
+            {field: column[keep] for field, column in labels.items()},
+            template_ids[keep],
+            assignments[keep] if assignments is not None else None,
+        )
+
+    def upsert(self, person_id, role, embedding, class_name=None, section=None, name=None):
+        """Insert or replace the primary embedding for person_id (UNIQUE in the table)."""
+        emb = np.asarray(embedding, dtype=np.float32).reshape(1, EMBEDDING_DIM)
+        person_id = str(person_id)
+        values = {"class_name": class_name, "section": section, "name": name}
+
+        with self._lock:
+            if not self._loaded:
+                # Nothing cached yet; the lazy load will pick this row up.
+                return
+
+            matrix, _, person_ids, roles, labels, template_ids, assignments = self._snapshot
+            person_rows = person_ids == person_id
+            hits = np.flatnonzero(person_rows & (template_ids == 0))
+
+            if not hits.size:
+                self._append(emb, person_id, role, values, 0)
+                return
+
+            row = hits[0]
+            matrix = matrix.copy()
+            matrix[row] = emb[0]
+            # Extra templates share the person's role and labels
+            roles = roles.copy()
+            roles[person_rows] = role
+            labels = {field: column.copy() for field, column in labels.items()}
+            for field, value in values.items():
+                labels[field][person_rows] = value
+            if self._ann is not None:
+                assignments = assignments.copy()
+                assignments[row] = self._ann.assign(emb)[0]
+
+            self._set_arrays(matrix, person_ids, roles, labels, template_ids, assignments)
+
+    def add_template(self, person_id, template_id, embedding):
+        """Add an extra template (face_templates row) for an indexed person."""
+        emb = np.asarray(embedding, dtype=np.float32).reshape(1, EMBEDDING_DIM)
+        person_id = str(person_id)
+
+        with self._lock:
+            if not self._loaded:
+                return
+
+            snap = self._snapshot
+            hits = np.flatnonzero(snap.person_ids == person_id)
+            if not hits.size:
+                return
+            row = hits[0]
+            values = {field: column[row] for field, column in snap.labels.items()}
+            self._append(emb, person_id, snap.roles[row], values, int(template_id))
+
+    def remove_template(self, template_id):
+        with self._lock:
+            if not self._loaded:
+                return
+            drop = self._snapshot.template_ids == int(template_id)
+            if drop.any():
+                self._drop(drop)
+
+    def remove(self, person_id, role=None):
+        """Remove a person and all of their templates."""
+        person_id = str(person_id)
+
+        with self._lock:
+            if not self._loaded:
+                return
+
+            snap = self._snapshot
+            drop = snap.person_ids == person_id
+            if role is not None:
+                drop &= snap.roles == role
+            if drop.any():
+                self._drop(drop)
+
+    def templates_of(self, person_id):
+        """(template_ids, (K, 128) matrix) of everything indexed for person_id."""
+        snap = self._snapshot
+        rows = np.flatnonzero(snap.person_ids == str(person_id))
+        return snap.template_ids[rows], snap.matrix[rows]
+
+    # ---------------------------------------
+    # Queries
+    # ---------------------------------------
+
+    def _ann_nearest(self, snap, query, nprobe=None):
+        """(row, distance) of the closest row among the probed IVF cells, or (None, inf)."""
+        rows, distances = self._ann.search(
+            query, snap.matrix, snap.assignments, k=1,
+            nprobe=nprobe or NPROBE, matrix_norms=snap.norms,
+        )
+        if rows.size == 0:
+            return None, float("inf")
+        return int(rows[0]), float(distances[0])
+
+    def _result(self, snap, row, distance, threshold):
+        if row is None or distance >= threshold:
+            return None
+        return {
+            "person_id": snap.person_ids[row],
+            "role": snap.roles[row],
+            "distance": distance,
+        }
+
+    def _scope_rows(self, snap, scope):
+        columns = {"role": snap.roles, **snap.labels}
+        mask = np.zeros(len(snap.person_ids), dtype=bool)
+        for clause in scope:
+            clause_mask = np.ones(len(snap.person_ids), dtype=bool)
+            for field, value in clause:
+                clause_mask &= columns[field] == value
+            mask |= clause_mask
+        return np.flatnonzero(mask)
+
+    def _view(self, snap, scope, mode):
+        """
+        Rows to search for (scope, mode), cached per snapshot. In "centroid"
+        mode each person becomes one row holding the mean of their templates.
+        """
+        key = (scope, mode)
+        part = self._partitions.get(key)
+        if part is not None and part.snapshot is snap:
+            return part
+
+        rows = self._scope_rows(snap, scope) if scope else np.arange(len(snap.person_ids))
+        if mode == "centroid" and rows.size:
+            people = snap.roles[rows].astype(str) + ":" + snap.person_ids[rows].astype(str)
+            _, first, group = np.unique(people, return_index=True, return_inverse=True)
+            sums = np.zeros((len(first), EMBEDDING_DIM), dtype=np.float32)
+            np.add.at(sums, group, snap.matrix[rows])
+            matrix = sums / np.bincount(group)[:, None].astype(np.float32)
+            part = Partition(snap, rows[first], matrix, np.einsum("ij,ij->i", matrix, matrix))
+        elif scope:
+            part = Partition(snap, rows, snap.matrix[rows], snap.norms[rows])
+        else:
+            part = Partition(snap, rows, snap.matrix, snap.norms)
+
+        partitions = self._partitions
+        if len(partitions) >= MAX_PARTITIONS:
+            partitions.clear()
+        partitions[key] = part
+        return part
+
+    def _search_view(self, snap, part, queries, threshold):
+        """Exact search of a view; None for queries with no match under threshold."""
+        if part.rows.size == 0:
+            return [None] * len(queries)
+
+        best, distances = match_batch(queries, part.matrix, part.norms)
+        return [
+            self._result(snap, int(part.rows[row]), float(distance), threshold)
+            for row, distance in zip(best[:, 0], distances[:, 0])
+        ]
+
+    def nearest_distance(self, embedding, exclude_person_id=None):
+        """Exact distance to the closest row not belonging to exclude_person_id (inf if none)."""
+        snap = self._snapshot
+        query = np.asarray(embedding, dtype=np.float32).reshape(EMBEDDING_DIM)
+        sq = sq_distances(query[None, :], snap.matrix, snap.norms)[0]
+        if exclude_person_id is not None:
+            sq = sq[snap.person_ids != str(exclude_person_id)]
+        if sq.size == 0:
+            return float("inf")
+        return float(np.sqrt(sq.min()))
+
+    def search_exact(self, embeddings, threshold=0.6):
+        """
+        Exact nearest face (any template) for each row of an (M, 128) batch,
+        whatever the gallery size or FACE_MATCH_MODE: no IVF, no centroids.
+        For duplicate checks, where a missed match enrolls a face twice.
+        """
+        snap = self._snapshot
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        if snap.matrix.shape[0] == 0:
+            return [None] * queries.shape[0]
+        return self._search_view(snap, self._view(snap, None, "min"), queries, threshold)
+
+    def search(self, embedding, threshold=0.6, nprobe=None, scope=None, mode=None, fallback=True):
+        """
+        Nearest enrolled face to `embedding`.
+        Returns {person_id, role, distance} or None if nothing is under threshold.
+        `nprobe` overrides the IVF recall/latency setting for this query.
+        With a `scope`, matches inside it win and carry "scoped": True; with
+        fallback=False only the scope is searched.
+        `mode` is "min" or "centroid" (default FACE_MATCH_MODE).
+        """
+        return self.search_batch([embedding], threshold, nprobe, scope, mode, fallback)[0]
+
+    def search_batch(self, embeddings, threshold=0.6, nprobe=None, scope=None, mode=None, fallback=True):
+        """
+        Nearest enrolled face for each row of an (M, 128) batch, computed as a
+        single (M, N) distance matrix. Returns a list of M results (or None).
+        """
+        mode = mode or DEFAULT_MATCH_MODE
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {mode}")
+
+        snap = self._snapshot
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        if snap.matrix.shape[0] == 0 or queries.shape[0] == 0:
+            return [None] * queries.shape[0]
+
+        results = [None] * queries.shape[0]
+        if scope:
+            results = self._search_view(snap, self._view(snap, scope, mode), queries, threshold)
+            for result in results:
+                if result is not None:
+                    result["scoped"] = True
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending or (scope and not fallback):
+            return results
+
+        # Fall back to the whole gallery for queries not matched in scope
+        if mode == "min" and self._ann is not None and snap.assignments is not None:
+            # Each query probes its own cells
+            for i in pending:
+                results[i] = self._result(snap, *self._ann_nearest(snap, queries[i], nprobe), threshold)
+            return results
+
+        rest = self._search_view(snap, self._view(snap, None, mode), queries[pending], threshold)
+        for i, result in zip(pending, rest):
+            results[i] = result
+        return results
+
+    def count(self, role=None):
+        """Number of enrolled people (primary embeddings), optionally of one role."""
+        snap = self._snapshot
+        primary = snap.template_ids == 0
+        if role is not None:
+            primary &= snap.roles == role
+        return int(np.count_nonzero(primary))
+
+    def __len__(self):
+        return self._snapshot[0].shape[0]
+
+
+_index = EmbeddingIndex()
+
+
+def get_index() -> EmbeddingIndex:
+    """Return the process-wide embedding index."""
+    return _index
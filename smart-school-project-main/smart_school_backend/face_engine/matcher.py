@@ -0,0 +1,68 @@
+# smart_school_backend/face_engine/matcher.py
+
+"""
+Vectorised brute-force matching of captured encodings against a gallery
+(the embedding index's matrices).
+
+sq_distances() is the single distance kernel of the face engine; the
+index, the IVF quantizer and the bulk-enroll dedup all call it. Every
+query/gallery distance comes from one matrix product via
+||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b, clipped at 0 against rounding,
+with the gallery norms precomputed by the caller. M faces against N
+embeddings is one (M, N) computation instead of M x N face_distance calls.
+"""
+
+import numpy as np
+
+EMBEDDING_DIM = 128
+
+
+def sq_distances(queries, points, point_norms=None):
+    """Squared L2 distances (M, N), clipped at 0. point_norms: precomputed row norms of points."""
+    if point_norms is None:
+        point_norms = np.einsum("ij,ij->i", points, points)
+    sq = (
+        np.einsum("ij,ij->i", queries, queries)[:, None]
+        + point_norms[None, :]
+        - 2.0 * queries @ points.T
+    )
+    return np.maximum(sq, 0.0, out=sq)
+
+
+def match_batch(queries, gallery, gallery_norms=None, k=1, threshold=None):
+    """
+    Nearest gallery rows for each query.
+
+    queries: (M, 128), gallery: (N, 128). Returns (indices, distances), both
+    (M, k) and sorted by distance; slots beyond N, or farther than
+    threshold, hold index -1 and distance inf.
+    """
+    queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    gallery = np.asarray(gallery, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    m, n = len(queries), len(gallery)
+
+    indices = np.full((m, k), -1, dtype=np.int64)
+    distances = np.full((m, k), np.inf, dtype=np.float32)
+    if m == 0 or n == 0:
+        return indices, distances
+
+    sq = sq_distances(queries, gallery, gallery_norms)
+
+    top = min(k, n)
+    if top == 1:
+        best = np.argmin(sq, axis=1)[:, None]
+    else:
+        best = np.argpartition(sq, top - 1, axis=1)[:, :top]
+        order = np.argsort(np.take_along_axis(sq, best, axis=1), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+
+    best_distances = np.sqrt(np.take_along_axis(sq, best, axis=1))
+    if threshold is not None:
+        far = best_distances > threshold
+        best = np.where(far, -1, best)
+        best_distances = np.where(far, np.inf, best_distances)
+
+    indices[:, :top] = best
+    distances[:, :top] = best_distances
+    return indices, distances
+
@@ -0,0 +1,103 @@
+# smart_school_backend/face_engine/motion.py
+
+"""
+Per-session motion gate for the realtime pipeline.
+
+An idle kiosk keeps posting frames of an empty corridor. Before any
+detection, each frame is reduced to a THUMB_WIDTH x THUMB_HEIGHT grey
+thumbnail (JPEGs are decoded at reduced scale, well under a millisecond)
+and compared with the thumbnail of the last frame the session actually
+processed. If fewer than MIN_CHANGED of the pixels moved by more than
+PIXEL_DELTA grey levels, the frame is skipped and the last processed
+result is returned again.
+
+Comparing against the last processed frame (not the previous one) means
+slow drift still adds up to a change. A frame is processed at least every
+MAX_IDLE seconds regardless, so a missed change is corrected quickly.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from smart_school_backend.face_engine.pipeline import open_preview
+
+ENABLED = os.environ.get("FACE_MOTION_GATE", "1").lower() not in ("0", "false", "no")
+PIXEL_DELTA = float(os.environ.get("FACE_MOTION_PIXEL_DELTA", 25))    # grey levels
+MIN_CHANGED = float(os.environ.get("FACE_MOTION_MIN_CHANGED", 0.005))  # fraction of thumbnail pixels
+MAX_IDLE = float(os.environ.get("FACE_MOTION_MAX_IDLE", 10))           # seconds
+THUMB_WIDTH, THUMB_HEIGHT = 64, 48
+MAX_SESSIONS = 512
+
+
+def thumbnail(image):
+    """(THUMB_HEIGHT, THUMB_WIDTH) int16 grey thumbnail and the frame's original (width, height)."""
+    preview, size = open_preview(image, THUMB_WIDTH * 2)
+    thumb = preview.resize((THUMB_WIDTH, THUMB_HEIGHT), Image.Resampling.BILINEAR)
+    return np.asarray(thumb, dtype=np.int16), size
+
+
+class MotionGate:
+    def __init__(self, pixel_delta=PIXEL_DELTA, min_changed=MIN_CHANGED, max_idle=MAX_IDLE,
+                 max_sessions=MAX_SESSIONS, enabled=ENABLED):
+        self.pixel_delta = pixel_delta
+        self.min_changed = min_changed
+        self.max_idle = max_idle
+        self.max_sessions = max_sessions
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()   # key -> (thumb, size, processed_at, result)
+        self._stats = {"processed": 0, "skipped": 0}
+
+    def check(self, key, image):
+        """
+        Returns (thumb, last result). last result is None when the frame must be
+        processed; pass thumb to update() afterwards. thumb is None if the
+        gate is off or the frame could not be decoded.
+        """
+        if not self.enabled:
+            return None, None
+        try:
+            thumb = thumbnail(image)
+        except Exception:
+            return None, None
+
+        pixels, size = thumb
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is not None and state[1] == size and time.monotonic() - state[2] < self.max_idle:
+                changed = np.count_nonzero(np.abs(pixels - state[0]) > self.pixel_delta) / pixels.size
+                if changed < self.min_changed:
+                    self._sessions.move_to_end(key)
+                    self._stats["skipped"] += 1
+                    return thumb, state[3]
+            self._stats["processed"] += 1
+        return thumb, None
+
+    def update(self, key, thumb, result):
+        """Remember the processed frame's thumbnail and the result to replay while nothing moves."""
+        if thumb is None:
+            return
+        pixels, size = thumb
+        with self._lock:
+            self._sessions[key] = (pixels, size, time.monotonic(), result)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "sessions": len(self._sessions), "enabled": self.enabled}
+
+
+_gate = MotionGate()
+
+
+def get_motion_gate() -> MotionGate:
+    """Return the process-wide motion gate."""
+    return _gate
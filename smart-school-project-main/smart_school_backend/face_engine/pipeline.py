@@ -0,0 +1,211 @@
+# smart_school_backend/face_engine/pipeline.py
+
+"""
+Shared decode → downscale → detect → encode pipeline for every face route.
+
+All latency / accuracy knobs live in PIPELINE_PROFILES:
+  max_size     longest image side fed to the detector (None = full resolution)
+  resample     PIL resampling filter used when downscaling
+  model        face_recognition detector: "hog" (CPU) or "cnn" (dlib CUDA)
+  upsample     number_of_times_to_upsample for detection
+  num_jitters  re-samples per encoding (1 = fastest)
+  quality      run the face_engine.quality gate before encoding
+
+Boxes returned by FacePipeline.process() are always in original-image
+coordinates, whatever size the detector actually ran at.
+"""
+
+import base64
+from io import BytesIO
+
+import numpy as np
+import face_recognition
+from PIL import Image
+
+from smart_school_backend.face_engine import quality as face_quality
+
+PIPELINE_PROFILES = {
+    # One-off enrollment photos: keep detail, quality matters more than speed
+    "enrollment": {"max_size": 800, "resample": Image.Resampling.LANCZOS, "model": "hog", "upsample": 1, "num_jitters": 1, "quality": True},
+    # /api/face/recognize and /recognize-batch
+    "recognition": {"max_size": 800, "resample": Image.Resampling.BILINEAR, "model": "hog", "upsample": 1, "num_jitters": 1, "quality": True},
+    # Kiosk video frames: small and fast, faces are close to the camera
+    "realtime": {"max_size": 320, "resample": Image.Resampling.BILINEAR, "model": "hog", "upsample": 1, "num_jitters": 1, "quality": True},
+    # Single phone photos for /api/auto-attendance/mark-*
+    "attendance": {"max_size": 640, "resample": Image.Resampling.BILINEAR, "model": "hog", "upsample": 1, "num_jitters": 1, "quality": True},
+}
+
+
+# ---------------------------------------
+# Decoding
+# ---------------------------------------
+
+def open_image(image):
+    """
+    Open a frame given as raw bytes, a readable file stream, a base64 string
+    (optionally a data URL) or an RGB numpy array and return an RGB PIL image.
+    """
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    return open_lazy(image).convert("RGB")
+
+
+def open_lazy(image):
+    """Like open_image, but returns the PIL image before its pixels are decoded (for draft())."""
+    if isinstance(image, str):
+        if "," in image:
+            image = image.split(",", 1)[1]
+        image = base64.b64decode(image)
+
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = BytesIO(image)
+
+    return Image.open(image)
+
+
+def open_preview(image, size):
+    """
+    Cheap greyscale preview for comparing frames. Returns (PIL "L" image,
+    original (width, height)); JPEGs are decoded at a reduced scale no
+    smaller than `size` px. Seekable streams are rewound afterwards.
+    """
+    if hasattr(image, "read"):
+        position = image.tell()
+        data = image.read()
+        image.seek(position)
+        image = data
+
+    pil_image = open_lazy(image)
+    original_size = pil_image.size
+    pil_image.draft("L", (size, size))
+    return pil_image.convert("L"), original_size
+
+
+def decode_image(image) -> np.ndarray:
+    """Decode a frame (bytes / stream / base64) → full-resolution RGB numpy array."""
+    return np.array(open_image(image))
+
+
+# ---------------------------------------
+# Pipeline
+# ---------------------------------------
+
+class FacePipeline:
+    def __init__(self, max_size=800, resample=Image.Resampling.BILINEAR, model="hog", upsample=1, num_jitters=1,
+                 quality=True):
+        if model not in ("hog", "cnn"):
+            raise ValueError(f"Unknown detector model: {model}")
+        self.max_size = max_size
+        self.resample = resample
+        self.model = model
+        self.upsample = upsample
+        self.num_jitters = num_jitters
+        self.quality = quality and face_quality.ENABLED
+
+    def prepare(self, image):
+        """
+        Decode and downscale. Returns (small RGB array, scale, (height, width))
+        where scale = small / original.
+        """
+        pil_image = open_image(image)
+        width, height = pil_image.size
+        scale = 1.0
+
+        if self.max_size and max(width, height) > self.max_size:
+            scale = self.max_size / max(width, height)
+            new_width = int(width * scale)
+            new_height = int(height * scale)
+            if new_width == 0 or new_height == 0:
+                raise ValueError(f"Invalid resize dimensions calculated ({new_width}x{new_height})")
+            pil_image = pil_image.resize((new_width, new_height), self.resample)
+
+        return np.ascontiguousarray(np.array(pil_image)), scale, (height, width)
+
+    def detect(self, image_np):
+        return face_recognition.face_locations(
+            image_np, number_of_times_to_upsample=self.upsample, model=self.model
+        )
+
+    def check(self, image_np, locations, scale=1.0):
+        """Quality result per location (all ok when the gate is off)."""
+        if not self.quality:
+            return [face_quality.QualityResult(True, None, {}) for _ in locations]
+        return [face_quality.assess_face(image_np, box, scale) for box in locations]
+
+    def encode(self, image_np, locations):
+        if not locations:
+            return []
+        encodings = face_recognition.face_encodings(image_np, locations, num_jitters=self.num_jitters)
+        return [enc.astype(np.float32) for enc in encodings]
+
+    def locate(self, image_np, scale, box=None):
+        """
+        Known face location in image_np coordinates, for callers that already
+        found the face (client-side cropping). `box` is (top, right, bottom,
+        left) in original-image coordinates; None means the whole image is
+        the face. Clamped to the image.
+        """
+        height, width = image_np.shape[:2]
+        if box is None:
+            return (0, width, height, 0)
+        top, right, bottom, left = (int(round(v * scale)) for v in box)
+        top, left = max(top, 0), max(left, 0)
+        bottom, right = min(bottom, height), min(right, width)
+        if bottom - top < 2 or right - left < 2:
+            raise ValueError("Face box is outside the image")
+        return (top, right, bottom, left)
+
+    def process(self, image):
+        """
+        Full pipeline for one frame:
+        {
+          "face_locations": [(top, right, bottom, left), ...],   # original coords
+          "face_encodings": [np.ndarray(128,), ...],
+          "rejected_faces": [{"box": ..., "reason": "too_blurry", "scores": {...}}, ...],
+          "original_dimensions": {"height": ..., "width": ...}
+        }
+        Faces failing the quality gate are not encoded and only appear in
+        "rejected_faces".
+        """
+        image_np, scale, (height, width) = self.prepare(image)
+        locations = self.detect(image_np)
+
+        accepted, rejected = [], []
+        for box, result in zip(locations, self.check(image_np, locations, scale)):
+            if result.ok:
+                accepted.append(box)
+            else:
+                rejected.append({
+                    "box": tuple(int(v / scale) for v in box),
+                    "reason": result.reason,
+                    "scores": result.scores,
+                })
+
+        encodings = self.encode(image_np, accepted)
+
+        return {
+            "face_locations": [
+                tuple(int(v / scale) for v in box) for box in accepted
+            ],
+            "face_encodings": encodings,
+            "rejected_faces": rejected,
+            "original_dimensions": {"height": height, "width": width},
+        }
+
+
+_pipelines = {}
+
+
+def get_pipeline(profile="recognition") -> FacePipeline:
+    """Return the shared FacePipeline for a profile in PIPELINE_PROFILES."""
+    pipeline = _pipelines.get(profile)
+    if pipeline is None:
+        pipeline = FacePipeline(**PIPELINE_PROFILES[profile])
+        _pipelines[profile] = pipeline
+    return pipeline
+
+
+def configure_pipeline(profile, **settings):
+    """Override settings of a profile at runtime (e.g. model="cnn" on a GPU box)."""
+    PIPELINE_PROFILES[profile] = {**PIPELINE_PROFILES.get(profile, {}), **settings}
+    _pipelines.pop(profile, None)
@@ -0,0 +1,123 @@
+# smart_school_backend/face_engine/quality.py
+
+"""
+Cheap face quality checks that run between detection and encoding.
+
+The 128-d encoder is the most expensive step of the pipeline. A face that
+is tiny, motion-blurred, badly lit or turned away gives a poor embedding
+anyway, so it is rejected first with a reason code:
+
+  face_too_small   shorter box side below MIN_FACE_SIZE original pixels
+  too_dark         mean grey level of the face below MIN_BRIGHTNESS
+  too_bright       mean grey level above MAX_BRIGHTNESS
+  too_blurry       variance of the Laplacian below MIN_SHARPNESS
+  not_frontal      nose far off the eye midpoint, or head rolled too far
+                   (5-point landmarks, much cheaper than the encoder)
+
+Checks run cheapest first and stop at the first failure.
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import face_recognition
+
+ENABLED = os.environ.get("FACE_QUALITY_GATE", "1").lower() not in ("0", "false", "no")
+MIN_FACE_SIZE = int(os.environ.get("FACE_MIN_SIZE", 60))                 # original-image pixels
+MIN_SHARPNESS = float(os.environ.get("FACE_MIN_SHARPNESS", 25.0))        # Laplacian variance
+MIN_BRIGHTNESS = float(os.environ.get("FACE_MIN_BRIGHTNESS", 40.0))      # 0-255
+MAX_BRIGHTNESS = float(os.environ.get("FACE_MAX_BRIGHTNESS", 220.0))
+MAX_YAW_OFFSET = float(os.environ.get("FACE_MAX_YAW_OFFSET", 0.25))      # nose offset / eye distance
+MAX_ROLL_DEGREES = float(os.environ.get("FACE_MAX_ROLL", 25.0))
+
+QualityResult = namedtuple("QualityResult", "ok reason scores")
+
+
+def _grey(crop):
+    return crop[..., 0] * 0.299 + crop[..., 1] * 0.587 + crop[..., 2] * 0.114
+
+
+def sharpness(grey):
+    """Variance of the 4-neighbour Laplacian; low means blurry."""
+    if grey.shape[0] < 3 or grey.shape[1] < 3:
+        return 0.0
+    lap = (
+        grey[:-2, 1:-1] + grey[2:, 1:-1] + grey[1:-1, :-2] + grey[1:-1, 2:]
+        - 4.0 * grey[1:-1, 1:-1]
+    )
+    return float(lap.var())
+
+
+def pose_offsets(image_np, box):
+    """
+    (yaw offset, roll degrees) from dlib's 5-point landmarks, or None if no
+    landmarks were found. Yaw offset is how far the nose sits from the eye
+    midpoint, as a fraction of the eye distance.
+    """
+    landmarks = face_recognition.face_landmarks(image_np, [box], model="small")
+    if not landmarks:
+        return None
+    points = landmarks[0]
+    left_eye = np.mean(points["left_eye"], axis=0)
+    right_eye = np.mean(points["right_eye"], axis=0)
+    nose = np.mean(points["nose_tip"], axis=0)
+
+    eye_vector = right_eye - left_eye
+    eye_distance = float(np.hypot(*eye_vector))
+    if eye_distance == 0:
+        return None
+
+    midpoint = (left_eye + right_eye) / 2.0
+    yaw = abs(float(np.dot(nose - midpoint, eye_vector)) / (eye_distance * eye_distance))
+    roll = abs(float(np.degrees(np.arctan2(eye_vector[1], eye_vector[0]))))
+    roll = min(roll, 180.0 - roll)
+    return yaw, roll
+
+
+def assess_face(image_np, box, scale=1.0, check_pose=True):
+    """
+    Check one detected face. `box` is (top, right, bottom, left) in image_np
+    coordinates and `scale` is image_np size / original size.
+    Returns QualityResult(ok, reason or None, scores).
+    """
+    top, right, bottom, left = box
+    scores = {"size": int(min(bottom - top, right - left) / scale)}
+    if scores["size"] < MIN_FACE_SIZE:
+        return QualityResult(False, "face_too_small", scores)
+
+    height, width = image_np.shape[:2]
+    crop = image_np[max(top, 0):min(bottom, height), max(left, 0):min(right, width)]
+    grey = _grey(crop.astype(np.float32))
+
+    scores["brightness"] = round(float(grey.mean()), 1) if grey.size else 0.0
+    if scores["brightness"] < MIN_BRIGHTNESS:
+        return QualityResult(False, "too_dark", scores)
+    if scores["brightness"] > MAX_BRIGHTNESS:
+        return QualityResult(False, "too_bright", scores)
+
+    scores["sharpness"] = round(sharpness(grey), 1)
+    if scores["sharpness"] < MIN_SHARPNESS:
+        return QualityResult(False, "too_blurry", scores)
+
+    if check_pose:
+        offsets = pose_offsets(image_np, box)
+        if offsets is not None:
+            scores["yaw"], scores["roll"] = round(offsets[0], 3), round(offsets[1], 1)
+            if offsets[0] > MAX_YAW_OFFSET or offsets[1] > MAX_ROLL_DEGREES:
+                return QualityResult(False, "not_frontal", scores)
+
+    return QualityResult(True, None, scores)
+
+
+class FaceQualityError(ValueError):
+    """Raised when the only face in an image fails the quality gate."""
+
+    def __init__(self, result):
+        super().__init__(f"Face rejected by quality check: {result.reason}")
+        self.reason = result.reason
+        self.scores = result.scores
+
+    def __reduce__(self):
+        # Rebuilt from the result when raised inside a worker process
+        return FaceQualityError, (QualityResult(False, self.reason, self.scores),)
@@ -0,0 +1,149 @@
+# smart_school_backend/face_engine/refresh.py
+
+"""
+Adaptive template refresh (opt-in: FACE_ADAPTIVE_REFRESH=1).
+
+Faces drift over a school year, so match distances slowly creep toward the
+recognition threshold. When a recognition is very confident, the encoding
+the request already computed is offered here; a background thread adds it
+as an extra template for that person (models.face_recognition
+.add_face_template, which prunes the most redundant template at the cap).
+
+An offer is accepted only if:
+  - the match distance is at most MAX_DISTANCE (very confident),
+  - the face box, when known, is at least MIN_FACE_SIZE pixels,
+  - the person has not been refreshed in the last INTERVAL seconds and
+    fewer than MAX_PER_HOUR refreshes happened in the last hour,
+and, on the worker thread,
+  - it differs from the person's templates by at least MIN_NOVELTY,
+  - every other person is at least MIN_MARGIN away (no look-alikes).
+
+offer() never blocks the request; when the queue is full, offers are dropped.
+"""
+
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from smart_school_backend.face_engine.index import get_index
+
+ENABLED = os.environ.get("FACE_ADAPTIVE_REFRESH", "").lower() in ("1", "true", "yes")
+MAX_DISTANCE = float(os.environ.get("FACE_REFRESH_MAX_DISTANCE", 0.35))
+MIN_NOVELTY = float(os.environ.get("FACE_REFRESH_MIN_NOVELTY", 0.12))
+MIN_MARGIN = float(os.environ.get("FACE_REFRESH_MIN_MARGIN", 0.6))
+MIN_FACE_SIZE = int(os.environ.get("FACE_REFRESH_MIN_FACE_SIZE", 80))   # pixels, shorter box side
+INTERVAL = float(os.environ.get("FACE_REFRESH_INTERVAL", 24 * 3600))   # seconds per person
+MAX_PER_HOUR = int(os.environ.get("FACE_REFRESH_MAX_PER_HOUR", 120))
+QUEUE_SIZE = 256
+
+
+class TemplateRefresher:
+    def __init__(self, enabled=ENABLED, index=None):
+        self.enabled = enabled
+        self.index = index or get_index()
+
+        self._lock = threading.Lock()
+        self._last = {}          # (role, person_id) -> monotonic time of last accepted offer
+        self._recent = []        # monotonic times of accepted offers in the last hour
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = None
+        self.stats = {"offered": 0, "queued": 0, "added": 0, "rejected": 0, "dropped": 0}
+
+    # ---------------------------------------
+    # Producers (request threads)
+    # ---------------------------------------
+
+    def offer(self, role, person_id, embedding, distance, box=None):
+        """Offer a recognition. Returns True if queued for a template refresh."""
+        if not self.enabled or embedding is None:
+            return False
+
+        self.stats["offered"] += 1
+        if distance > MAX_DISTANCE:
+            return False
+        if box is not None:
+            top, right, bottom, left = box
+            if min(bottom - top, right - left) < MIN_FACE_SIZE:
+                return False
+
+        key = (role, str(person_id))
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < INTERVAL:
+                return False
+            self._recent = [t for t in self._recent if now - t < 3600]
+            if len(self._recent) >= MAX_PER_HOUR:
+                return False
+
+            try:
+                self._queue.put_nowait((role, str(person_id), np.array(embedding, dtype=np.float32)))
+            except queue.Full:
+                self.stats["dropped"] += 1
+                return False
+
+            self._last[key] = now
+            self._recent.append(now)
+            self.stats["queued"] += 1
+
+        self._ensure_worker()
+        return True
+
+    # ---------------------------------------
+    # Worker
+    # ---------------------------------------
+
+    def _accept(self, person_id, embedding):
+        """Quality gate against the current gallery."""
+        _, templates = self.index.templates_of(person_id)
+        if len(templates) == 0:
+            return False
+        novelty = np.sqrt(np.einsum("ij,ij->i", templates - embedding, templates - embedding)).min()
+        if novelty < MIN_NOVELTY:
+            return False
+        return self.index.nearest_distance(embedding, exclude_person_id=person_id) >= MIN_MARGIN
+
+    def process(self, role, person_id, embedding):
+        # Imported here: models.face_recognition imports the index module
+        from smart_school_backend.models.face_recognition import add_face_template, get_connection
+
+        # The margin checks read the index; make sure it holds the gallery first
+        self.index.ensure_loaded(get_connection())
+        if not self._accept(person_id, embedding):
+            self.stats["rejected"] += 1
+            return None
+
+        added = add_face_template(person_id, embedding, role=role)
+        if added is not None:
+            self.stats["added"] += 1
+            print(f"[REFRESH] New template {added[0]} for {role} {person_id} (pruned {added[1]})")
+        return added
+
+    def _run(self):
+        while True:
+            role, person_id, embedding = self._queue.get()
+            try:
+                self.process(role, person_id, embedding)
+            except Exception as e:
+                print(f"[REFRESH] Failed for {role} {person_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="template-refresh", daemon=True)
+                self._thread.start()
+
+
+_refresher = TemplateRefresher()
+
+
+def get_refresher() -> TemplateRefresher:
+    """Return the process-wide template refresher."""
+    return _refresher
@@ -0,0 +1,127 @@
+# smart_school_backend/face_engine/scheduler.py
+
+"""
+Latest-frame-wins scheduling for realtime camera sessions.
+
+When recognition is slower than a kiosk's send rate, plain HTTP handling
+lets requests pile up and the server works through stale frames while the
+on-screen boxes lag behind. Per session, at most one frame is processed
+and at most one waits:
+
+  - a frame arriving while the session is idle runs at once,
+  - a frame arriving while another runs takes the single waiting place;
+    a frame already waiting there is superseded and dropped without ever
+    reaching the detector,
+  - a waiting frame is also dropped after MAX_WAIT seconds.
+
+Dropped frames are counted per session and in total.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MAX_WAIT = float(os.environ.get("FACE_FRAME_MAX_WAIT", 5.0))   # seconds a frame may wait
+SESSION_TTL_SECONDS = 60.0   # forget idle sessions (and their counters)
+
+
+class FrameSuperseded(Exception):
+    """A newer frame of the same session replaced this one (or it waited too long)."""
+
+    def __init__(self, dropped):
+        super().__init__("Superseded by a newer frame")
+        self.dropped = dropped
+
+
+class _Session:
+    __slots__ = ("running", "waiting", "dropped", "last_seen")
+
+    def __init__(self):
+        self.running = False
+        self.waiting = None     # ticket of the frame waiting its turn
+        self.dropped = 0
+        self.last_seen = time.monotonic()
+
+
+class FrameScheduler:
+    def __init__(self, max_wait=MAX_WAIT):
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._sessions = {}
+        self._stats = {"processed": 0, "dropped": 0}
+
+    def _session(self, key, now):
+        for stale in [k for k, s in self._sessions.items()
+                      if not s.running and s.waiting is None and now - s.last_seen > SESSION_TTL_SECONDS]:
+            del self._sessions[stale]
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = _Session()
+        session.last_seen = now
+        return session
+
+    def _drop(self, session):
+        session.dropped += 1
+        self._stats["dropped"] += 1
+
+    @contextmanager
+    def turn(self, key):
+        """
+        Wait for this frame's turn in session `key`; yields the session's
+        dropped-frame count. Raises FrameSuperseded if a newer frame
+        replaced it first.
+        """
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            session = self._session(key, time.monotonic())
+            if session.waiting is not None:
+                # Even if the session just went idle, the waiting frame is older
+                session.waiting["superseded"] = True
+                session.waiting = None
+                self._drop(session)
+                self._cond.notify_all()
+
+            if session.running:
+                ticket = session.waiting = {"superseded": False}
+
+                while session.running and not ticket["superseded"]:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        session.waiting = None
+                        ticket["superseded"] = True
+                        self._drop(session)
+                        break
+                    self._cond.wait(remaining)
+
+                if ticket["superseded"]:
+                    raise FrameSuperseded(session.dropped)
+                session.waiting = None
+
+            session.running = True
+            self._stats["processed"] += 1
+            dropped = session.dropped
+
+        try:
+            yield dropped
+        finally:
+            with self._cond:
+                session.running = False
+                session.last_seen = time.monotonic()
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "sessions": len(self._sessions),
+                "busy": sum(1 for s in self._sessions.values() if s.running),
+            }
+
+
+_scheduler = FrameScheduler()
+
+
+def get_frame_scheduler() -> FrameScheduler:
+    """Return the process-wide realtime frame scheduler."""
+    return _scheduler
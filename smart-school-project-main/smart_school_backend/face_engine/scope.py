@@ -0,0 +1,82 @@
+# smart_school_backend/face_engine/scope.py
+
+"""
+Search scopes for the embedding index.
+
+A scope is a tuple of clauses; a gallery row is in scope when it matches
+every (field, value) pair of at least one clause. Fields are "role",
+"class_name", "section" and "name" (see index.LABEL_FIELDS). Scopes are
+hashable so the index can cache one partition per scope.
+
+Examples:
+    make_scope(role="student", class_name="10", section="A")
+    timetable_scope(conn, class_name="10", section="A")   # period now in 10-A
+    timetable_scope(conn, teacher_name="R. Sharma")       # whoever R. Sharma teaches now
+"""
+
+from datetime import datetime
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def make_scope(role=None, class_name=None, section=None, name=None):
+    """Single-clause scope; None fields are not filtered. Returns None if empty."""
+    clause = tuple(
+        (field, value)
+        for field, value in (("role", role), ("class_name", class_name), ("section", section), ("name", name))
+        if value not in (None, "")
+    )
+    return (clause,) if clause else None
+
+
+def timetable_scope(conn, class_name=None, section=None, teacher_name=None, at=None):
+    """
+    Scope for the period running at `at` (default: now): the students of each
+    scheduled class-section plus its teacher. Filter by class/section (the
+    room's class) and/or teacher_name. Returns None when nothing is scheduled.
+    """
+    at = at or datetime.now()
+    query = (
+        "SELECT class_name, section, teacher_name FROM timetable "
+        "WHERE day = ? AND start_time <= ? AND end_time > ?"
+    )
+    now = at.strftime("%H:%M")
+    params = [DAYS[at.weekday()], now, now]
+    for column, value in (("class_name", class_name), ("section", section), ("teacher_name", teacher_name)):
+        if value:
+            query += f" AND {column} = ?"
+            params.append(value)
+
+    clauses = set()
+    for row in conn.execute(query, params).fetchall():
+        clauses.add((("role", "student"), ("class_name", row[0]), ("section", row[1])))
+        if row[2]:
+            clauses.add((("role", "teacher"), ("name", row[2])))
+
+    return tuple(sorted(clauses)) if clauses else None
+
+
+def scope_from_params(conn, params):
+    """
+    Build a scope from request parameters, either flat or nested under "scope":
+        { "class_name": "10", "section": "A", "role": "student" }
+        { "timetable": true, "class_name": "10", "section": "A" }
+    Returns None (search the whole school) when no scope is given.
+    """
+    fields = params.get("scope") if isinstance(params.get("scope"), dict) else params
+    if not fields:
+        return None
+
+    if str(fields.get("timetable", "")).lower() in ("1", "true", "yes"):
+        return timetable_scope(
+            conn,
+            class_name=fields.get("class_name"),
+            section=fields.get("section"),
+            teacher_name=fields.get("teacher_name"),
+        )
+
+    return make_scope(
+        role=fields.get("role"),
+        class_name=fields.get("class_name"),
+        section=fields.get("section"),
+    )
@@ -0,0 +1,121 @@
+# smart_school_backend/face_engine/tracker.py
+
+"""
+Lightweight per-session face tracker for realtime attendance.
+
+Boxes from consecutive frames of one camera session are associated by IoU.
+Once a track has been identified, later frames only need detection: the
+identity is reused until the track is lost or REVERIFY_SECONDS have passed,
+so the expensive 128-d encoding runs once per person instead of per frame.
+"""
+
+import itertools
+import threading
+import time
+
+import numpy as np
+
+IOU_THRESHOLD = 0.3        # minimum overlap to continue a track
+MAX_MISSED_FRAMES = 2      # frames a track may go undetected before it is dropped
+REVERIFY_SECONDS = 5.0     # re-encode identified tracks this often
+SESSION_TTL_SECONDS = 60.0 # forget sessions that stopped sending frames
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU matrix for (top, right, bottom, left) boxes: (A, 4) x (B, 4) → (A, B)."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class Track:
+    _ids = itertools.count(1)
+
+    def __init__(self, box):
+        self.track_id = next(Track._ids)
+        self.box = box
+        self.missed = 0
+        self.identity = None       # last recognition result for this face
+        self.verified_at = 0.0
+
+    def needs_encoding(self, now):
+        return self.identity is None or now - self.verified_at >= REVERIFY_SECONDS
+
+    def assign(self, identity, now=None):
+        """Record a fresh recognition result; None keeps the track unidentified."""
+        self.identity = identity
+        self.verified_at = now if now is not None else time.monotonic()
+
+
+class FaceTracker:
+    def __init__(self):
+        self.tracks = []
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, boxes):
+        """
+        Associate this frame's boxes with existing tracks (greedy by IoU).
+        Returns one Track per input box, in the same order.
+        """
+        self.last_seen = time.monotonic()
+        assigned = [None] * len(boxes)
+        matched = set()
+
+        if self.tracks and boxes:
+            iou = box_iou([t.box for t in self.tracks], boxes)
+            # Visit candidate pairs from the highest overlap down
+            for flat in np.argsort(-iou, axis=None):
+                ti, bi = np.unravel_index(flat, iou.shape)
+                if iou[ti, bi] < IOU_THRESHOLD:
+                    break
+                if ti in matched or assigned[bi] is not None:
+                    continue
+                track = self.tracks[ti]
+                track.box = boxes[bi]
+                track.missed = 0
+                assigned[bi] = track
+                matched.add(ti)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched:
+                track.missed += 1
+            if track.missed <= MAX_MISSED_FRAMES:
+                survivors.append(track)
+
+        for bi, box in enumerate(boxes):
+            if assigned[bi] is None:
+                assigned[bi] = Track(box)
+                survivors.append(assigned[bi])
+
+        self.tracks = survivors
+        return assigned
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(session_id) -> FaceTracker:
+    """Return the tracker for a camera session, evicting idle sessions."""
+    now = time.monotonic()
+    with _trackers_lock:
+        for key in [k for k, t in _trackers.items() if now - t.last_seen > SESSION_TTL_SECONDS]:
+            del _trackers[key]
+
+        tracker = _trackers.get(session_id)
+        if tracker is None:
+            tracker = _trackers[session_id] = FaceTracker()
+        return tracker
@@ -0,0 +1,206 @@
+# smart_school_backend/face_engine/workers.py
+
+"""
+Recognition executor: runs decode / detect / encode work in a process pool
+instead of on Flask request threads.
+
+Each frame costs tens of milliseconds of dlib CPU time. With that work in
+separate processes, a burst of kiosk frames saturates the pool rather than
+the web server, so dashboards keep answering.
+
+Backpressure instead of unbounded queueing:
+  - at most MAX_PENDING tasks queued or running; beyond that run() raises
+    RecognitionUnavailable(503) with a Retry-After estimate,
+  - at most MAX_PER_CLIENT in flight per kiosk session_id; beyond that
+    RecognitionUnavailable(429). Requests without a session_id are bounded
+    by MAX_PENDING only: behind a NAT or proxy a whole school shares one
+    remote address,
+  - a task not finished within its timeout raises RecognitionUnavailable(503).
+
+Only module-level functions with picklable arguments can be submitted
+(see face_engine/encoder.py). Index search and DB work stay in the web
+process. FACE_WORKERS=0 runs tasks inline on the calling thread.
+"""
+
+import importlib
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import jsonify
+
+WORKERS = int(os.environ.get("FACE_WORKERS", os.cpu_count() or 1))
+MAX_PENDING = int(os.environ.get("FACE_MAX_PENDING", max(WORKERS, 1) * 4))
+MAX_PER_CLIENT = int(os.environ.get("FACE_MAX_PER_CLIENT", 2))
+TIMEOUT = float(os.environ.get("FACE_TIMEOUT", 10))   # seconds per task
+MIN_RETRY_AFTER = 1                                   # seconds
+WORKER_PRELOAD = "smart_school_backend.face_engine.encoder"   # imports face_recognition
+
+
+class RecognitionUnavailable(Exception):
+    """The executor refused or gave up on a task; maps to an HTTP error."""
+
+    def __init__(self, message, status=503, retry_after=MIN_RETRY_AFTER):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def unavailable_response(e):
+    """Flask response for RecognitionUnavailable, with a Retry-After hint."""
+    response = jsonify({"success": False, "error": str(e), "retry_after": e.retry_after})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def request_client(params=None):
+    """Key for the per-client limit and caches: the kiosk session_id, or None without one."""
+    return (params or {}).get("session_id") or None
+
+
+def worker_context():
+    """
+    Start method for worker pools: "forkserver" ("spawn" where unavailable).
+    Forking the threaded web process directly could copy a lock another
+    thread holds (index, sqlite, logging) into the child and deadlock it.
+    The fork server preloads the face engine once; its forks are cheap.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([WORKER_PRELOAD])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def init_worker():
+    """Pool initializer: import face_recognition / dlib before the first task."""
+    importlib.import_module(WORKER_PRELOAD)
+
+
+def _picklable(value):
+    """Read file streams into bytes so they can be sent to a worker process."""
+    if hasattr(value, "read"):
+        return value.read()
+    if isinstance(value, list):
+        return [_picklable(v) for v in value]
+    return value
+
+
+class RecognitionExecutor:
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, max_per_client=MAX_PER_CLIENT, timeout=TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_client = max_per_client
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pending = 0
+        self._clients = {}
+        self._avg_seconds = 0.2   # moving average task time, for Retry-After
+        self._stats = {"completed": 0, "rejected_busy": 0, "rejected_client": 0, "timeouts": 0, "crashes": 0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=worker_context(), initializer=init_worker
+                )
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _retry_after(self):
+        waves = self._pending / max(self.workers, 1)
+        return max(MIN_RETRY_AFTER, math.ceil(waves * self._avg_seconds))
+
+    def _acquire(self, client):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected_busy"] += 1
+                raise RecognitionUnavailable("Recognition is busy, retry shortly", 503, self._retry_after())
+            if client is not None and self._clients.get(client, 0) >= self.max_per_client:
+                self._stats["rejected_client"] += 1
+                raise RecognitionUnavailable("Too many frames in flight for this client", 429, MIN_RETRY_AFTER)
+            self._pending += 1
+            if client is not None:
+                self._clients[client] = self._clients.get(client, 0) + 1
+
+    def _release(self, client, started):
+        with self._lock:
+            self._pending -= 1
+            if client is not None:
+                left = self._clients.get(client, 1) - 1
+                if left > 0:
+                    self._clients[client] = left
+                else:
+                    self._clients.pop(client, None)
+            self._stats["completed"] += 1
+            self._avg_seconds = 0.9 * self._avg_seconds + 0.1 * (time.monotonic() - started)
+
+    def run(self, fn, *args, client=None, timeout=None):
+        """
+        Run fn(*args) on the pool and return its result (exceptions raised by
+        fn propagate). Raises RecognitionUnavailable when the pool is full,
+        the client has too much in flight, or the task times out.
+        """
+        self._acquire(client)
+        started = time.monotonic()
+
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._release(client, started)
+
+        try:
+            future = self._get_pool().submit(fn, *[_picklable(a) for a in args])
+        except Exception:
+            self._release(client, started)
+            raise
+        # Slots are freed when the task really ends, not when the caller gives up
+        future.add_done_callback(lambda _: self._release(client, started))
+
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise RecognitionUnavailable("Recognition timed out", 503, self._retry_after())
+        except BrokenProcessPool:
+            with self._lock:
+                self._stats["crashes"] += 1
+            self._reset_pool()
+            raise RecognitionUnavailable("Recognition worker crashed, retry", 503, MIN_RETRY_AFTER)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "clients": len(self._clients),
+                "avg_seconds": round(self._avg_seconds, 3),
+            }
+
+    def shutdown(self):
+        self._reset_pool()
+
+
+_executor = RecognitionExecutor()
+
+
+def get_executor() -> RecognitionExecutor:
+    """Return the process-wide recognition executor."""
+    return _executor
@@ -1,19 +1,29 @@
-import sqlite3
 import os
+
 import numpy as np
+from flask import has_app_context
+
+from smart_school_backend.face_engine.index import get_index
+from smart_school_backend.face_engine.scope import make_scope
+from smart_school_backend.utils.db import DB_PATH, get_db, get_connection as get_thread_connection
+
+
+# Templates kept per person, the face_embeddings row included
+MAX_TEMPLATES = int(os.environ.get("FACE_MAX_TEMPLATES", 5))
 
-# =========================
-# DATABASE PATH RESOLUTION
-# =========================
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "..", "database", "smart_school.db")
+PEOPLE_TABLES = {"student": "students", "teacher": "teachers"}
 
 
 def get_connection():
     """
-    Returns a new SQLite connection to smart_school.db
+    Returns the SQLite connection to smart_school.db for the caller:
+    inside a request (app context) the request's pooled connection
+    (utils.db.get_db), elsewhere (template refresher, scripts) this
+    thread's long-lived connection. Callers must not close it.
     """
-    return sqlite3.connect(DB_PATH)
+    if has_app_context():
+        return get_db()
+    return get_thread_connection(DB_PATH)
 
 
 # ========================================================
@@ -42,8 +52,17 @@ def create_face_embeddings_table():
         )
     """)
 
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS face_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            person_id TEXT NOT NULL REFERENCES face_embeddings(person_id) ON DELETE CASCADE,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            embedding BLOB NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_face_templates_person ON face_templates(person_id)")
+
     conn.commit()
-    conn.close()
     print("✔ face_embeddings table verified/created.")
 
 
@@ -74,7 +93,114 @@ def store_face_embedding(role, person_id, name, email, class_name, section, embe
     """, (role, person_id, name, email, class_name, section, embedding_blob))
 
     conn.commit()
-    conn.close()
+
+    # Keep the in-memory recognition index in sync with the table
+    get_index().upsert(
+        person_id, role, embedding,
+        class_name=class_name, section=section, name=name,
+    )
+
+
+def enroll_face_embedding(role, person_id, name, email, class_name, section, embedding, threshold=0.6):
+    """
+    Store the embedding unless the face is already enrolled.
+
+    The nearest existing face comes from one exact search of the in-memory
+    index (never the approximate IVF path).
+    The check and the store run under the index writer lock, so two
+    concurrent enrollments of the same face cannot both pass.
+
+    Returns None when stored, otherwise the existing match:
+        { "person_id", "role", "name", "distance" }
+    """
+    conn = get_connection()
+    index = get_index()
+
+    with index.lock:
+        index.ensure_loaded(conn)
+        existing = index.search_exact([embedding], threshold=threshold)[0]
+        if existing is not None:
+            row = conn.execute(
+                "SELECT name FROM face_embeddings WHERE person_id = ?",
+                (existing["person_id"],)
+            ).fetchone()
+            existing["name"] = row[0] if row else None
+            return existing
+
+        store_face_embedding(role, person_id, name, email, class_name, section, embedding)
+        return None
+
+
+def _templates_to_prune(template_ids, matrix, max_templates):
+    """
+    Pick extra templates to delete so at most max_templates remain. The one
+    closest to another template of the same person goes first: it adds the
+    least new lighting / angle information. The primary (id 0) is kept.
+    """
+    template_ids = list(template_ids)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    pruned = []
+
+    while len(template_ids) > max(max_templates, 1):
+        diff = matrix[:, None, :] - matrix[None, :, :]
+        dist = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+        np.fill_diagonal(dist, np.inf)
+        nearest = dist.min(axis=1)
+        nearest[[i for i, t in enumerate(template_ids) if t == 0]] = np.inf
+
+        drop = int(np.argmin(nearest))
+        pruned.append(template_ids.pop(drop))
+        matrix = np.delete(matrix, drop, axis=0)
+
+    return pruned
+
+
+def add_face_template(person_id, embedding, max_templates=MAX_TEMPLATES, role=None):
+    """
+    Store another template (photo) for an already enrolled person, pruning
+    the most redundant extra templates beyond max_templates.
+
+    Returns (template_id, pruned_template_ids), or None if the person has no
+    face_embeddings row (of `role`, when given). template_id is in pruned_template_ids when the new
+    photo itself was the most redundant one.
+    """
+    person_id = str(person_id)
+    emb = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    conn = get_connection()
+    index = get_index()
+
+    with index.lock:
+        primary = conn.execute(
+            "SELECT embedding, role FROM face_embeddings WHERE person_id = ?", (person_id,)
+        ).fetchone()
+        if primary is None or (role is not None and primary[1] != role):
+            return None
+
+        with conn:
+            template_id = conn.execute(
+                "INSERT INTO face_templates (person_id, embedding) VALUES (?, ?)",
+                (person_id, emb.tobytes())
+            ).lastrowid
+
+            extras = conn.execute(
+                "SELECT id, embedding FROM face_templates WHERE person_id = ? ORDER BY id",
+                (person_id,)
+            ).fetchall()
+            template_ids = [0] + [row[0] for row in extras]
+            matrix = np.stack(
+                [np.frombuffer(primary[0], dtype=np.float32)]
+                + [np.frombuffer(row[1], dtype=np.float32) for row in extras]
+            )
+
+            pruned = _templates_to_prune(template_ids, matrix, max_templates)
+            conn.executemany("DELETE FROM face_templates WHERE id = ?", [(t,) for t in pruned])
+
+        if template_id not in pruned:
+            index.add_template(person_id, template_id, emb)
+        for t in pruned:
+            index.remove_template(t)
+
+    return template_id, pruned
 
 
 # ========================================================
@@ -105,7 +231,6 @@ def load_all_embeddings():
     """)
 
     rows = cur.fetchall()
-    conn.close()
 
     embeddings = []
     for role, person_id, name, email, class_name, section, emb_blob in rows:
@@ -122,3 +247,52 @@ def load_all_embeddings():
         })
 
     return embeddings
+
+
+
+# ========================================================
+# 4. MATCH AGAINST ENROLLED PEOPLE
+# ========================================================
+
+def match_people(embeddings, role, threshold=0.6, conn=None):
+    """
+    Nearest enrolled student or teacher for each captured embedding.
+
+    One batched search of the shared in-memory index, restricted to `role`
+    (templates included), then one lookup of the matched people. Faces
+    whose person no longer exists come back as None.
+
+    Returns a list with, per embedding, None or:
+        { "id", "name", "email", "distance" }
+    """
+    conn = conn or get_connection()
+    index = get_index()
+    index.ensure_loaded(conn)
+
+    results = index.search_batch(
+        embeddings, threshold=threshold, scope=make_scope(role=role), mode="min", fallback=False
+    )
+
+    ids = sorted({r["person_id"] for r in results if r is not None})
+    people = {}
+    if ids:
+        placeholders = ",".join("?" * len(ids))
+        rows = conn.execute(
+            f"SELECT id, name, email FROM {PEOPLE_TABLES[role]} WHERE id IN ({placeholders})",
+            ids
+        ).fetchall()
+        people = {str(row[0]): row for row in rows}
+
+    matches = []
+    for result in results:
+        person = people.get(result["person_id"]) if result is not None else None
+        if person is None:
+            matches.append(None)
+            continue
+        matches.append({
+            "id": person[0],
+            "name": person[1],
+            "email": person[2],
+            "distance": result["distance"],
+        })
+    return matches
@@ -1,5 +1,6 @@
 from datetime import date, datetime
 from smart_school_backend.utils.db import get_db
+from smart_school_backend.utils.presence import get_presence
 
 
 def create_teacher_attendance_table():
@@ -26,12 +27,10 @@ def mark_teacher_present_once(teacher_id: int) -> bool:
 
     today = date.today().isoformat()
 
-    # Check if already marked
-    cur.execute(
-        "SELECT id FROM teacher_attendance WHERE teacher_id = ? AND date = ?",
-        (teacher_id, today)
-    )
-    if cur.fetchone():
+    # Already marked today: answered by the in-memory presence set (loaded
+    # from the table once per day), no SELECT
+    presence = get_presence()
+    if presence.is_marked("teacher", teacher_id, today):
         return False
 
     # Insert attendance
@@ -39,9 +38,11 @@ def mark_teacher_present_once(teacher_id: int) -> bool:
         """
         INSERT INTO teacher_attendance (teacher_id, date, status, marked_at)
         VALUES (?, ?, ?, ?)
+        ON CONFLICT(teacher_id, date) DO NOTHING
         """,
         (teacher_id, today, "present", datetime.utcnow().isoformat())
     )
 
     db.commit()
-    return True
+    presence.add("teacher", teacher_id, today)
+    return cur.rowcount > 0
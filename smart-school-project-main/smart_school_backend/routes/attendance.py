@@ -4,8 +4,10 @@ from flask import Blueprint, request, jsonify, current_app
 
 try:
     from smart_school_backend.utils.db import get_db
+    from smart_school_backend.utils.presence import get_presence
 except ImportError:
     from utils.db import get_db
+    from utils.presence import get_presence
 
 from flask_jwt_extended import jwt_required
 from datetime import date as date_module
@@ -55,17 +57,15 @@ def mark_attendance():
                 if not s:
                     return jsonify({"error": "Student not found"}), 404
 
-                # idempotent insert
-                cur.execute(
-                    "SELECT id FROM student_attendance WHERE student_id = ? AND date = ?",
-                    (s["id"], today),
-                )
-                if not cur.fetchone():
+                # idempotent insert; "already marked" comes from the presence set
+                if not get_presence().is_marked("student", s["id"], today):
                     cur.execute(
-                        "INSERT INTO student_attendance (student_id, class_name, date, status, marked_at) VALUES (?, ?, ?, 'present', ?)",
+                        "INSERT INTO student_attendance (student_id, class_name, date, status, marked_at) VALUES (?, ?, ?, 'present', ?) "
+                        "ON CONFLICT(student_id, date) DO NOTHING",
                         (s["id"], s["class_name"], today, datetime.utcnow().isoformat()),
                     )
                     db.commit()
+                    get_presence().add("student", s["id"], today)
 
                 return jsonify({"success": True, "marked": {"id": s["id"], "date": today}}), 200
 
@@ -80,16 +80,14 @@ def mark_attendance():
                 if not t:
                     return jsonify({"error": "Teacher not found"}), 404
 
-                cur.execute(
-                    "SELECT id FROM teacher_attendance WHERE teacher_id = ? AND date = ?",
-                    (t["id"], today),
-                )
-                if not cur.fetchone():
+                if not get_presence().is_marked("teacher", t["id"], today):
                     cur.execute(
-                        "INSERT INTO teacher_attendance (teacher_id, date, status, marked_at) VALUES (?, ?, 'present', ?)",
+                        "INSERT INTO teacher_attendance (teacher_id, date, status, marked_at) VALUES (?, ?, 'present', ?) "
+                        "ON CONFLICT(teacher_id, date) DO NOTHING",
                         (t["id"], today, datetime.utcnow().isoformat()),
                     )
                     db.commit()
+                    get_presence().add("teacher", t["id"], today)
 
                 return jsonify({"success": True, "marked": {"id": t["id"], "date": today}}), 200
 
@@ -104,6 +102,10 @@ def mark_attendance():
 
     if not student_id or not date:
         return jsonify({"error": "student_id and date are required"}), 400
+    try:
+        student_id = int(student_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "student_id must be an integer"}), 400
 
     # Upsert pattern: if already exists for that date, update; else insert
     try:
@@ -133,6 +135,7 @@ def mark_attendance():
             return jsonify({"error": "Failed to save attendance"}), 500
 
     db.commit()
+    get_presence().add("student", student_id, date)
     return jsonify({"message": "Attendance marked successfully"}), 200
 
 
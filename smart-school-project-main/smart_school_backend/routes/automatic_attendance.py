@@ -7,24 +7,37 @@ Uses face_recognition embeddings to auto-mark student/teacher attendance.
 URLs (after app.py prefix):
 - POST /api/auto-attendance/mark-student
 - POST /api/auto-attendance/mark-teacher
+- GET  /api/auto-attendance/jobs/<job_id>          (async mode result)
+- GET  /api/auto-attendance/jobs/<job_id>/events   (same, as server-sent events)
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, url_for
 from flask_jwt_extended import jwt_required
 from datetime import datetime, date
-from io import BytesIO
-import base64
 import json
-
-import numpy as np
-from PIL import Image
-import face_recognition
+import time
 
 # DB helper
 try:
     from smart_school_backend.utils.db import get_db
+    from smart_school_backend.utils.image_input import get_image_payload
+    from smart_school_backend.face_engine.pipeline import get_pipeline
+    from smart_school_backend.models.face_recognition import match_people
+    from smart_school_backend.utils.presence import get_presence
+    from smart_school_backend.face_engine.refresh import get_refresher
+    from smart_school_backend.face_engine.quality import FaceQualityError, QualityResult
+    from smart_school_backend.face_engine.workers import RecognitionUnavailable, get_executor, request_client
+    from smart_school_backend.utils.jobs import get_job_store
 except ImportError:
     from utils.db import get_db
+    from utils.image_input import get_image_payload
+    from face_engine.pipeline import get_pipeline
+    from models.face_recognition import match_people
+    from utils.presence import get_presence
+    from face_engine.refresh import get_refresher
+    from face_engine.quality import FaceQualityError, QualityResult
+    from face_engine.workers import RecognitionUnavailable, get_executor, request_client
+    from utils.jobs import get_job_store
 
 bp = Blueprint("automatic_attendance", __name__)
 
@@ -33,22 +46,20 @@ bp = Blueprint("automatic_attendance", __name__)
 # Shared Helpers
 # ---------------------------------------
 
-def decode_base64_image(image_data: str) -> np.ndarray:
-    """Decode base64 (optional data URL) → RGB numpy array."""
+def extract_single_embedding(image_data):
+    """
+    Run the shared "attendance" face pipeline on one photo (base64, bytes or
+    stream) and return its single face embedding, or raise ValueError
+    (FaceQualityError if the face failed the quality gate).
+    """
     if not image_data:
         raise ValueError("No image data provided")
 
-    if "," in image_data:
-        image_data = image_data.split(",", 1)[1]
-
-    image_bytes = base64.b64decode(image_data)
-    image = Image.open(BytesIO(image_bytes)).convert("RGB")
-    return np.array(image)
-
-
-def extract_single_embedding(image_array: np.ndarray):
-    """Return a single face embedding, or raise ValueError."""
-    encodings = face_recognition.face_encodings(image_array)
+    frame = get_pipeline("attendance").process(image_data)
+    encodings = frame["face_encodings"]
+    if len(encodings) == 0 and frame["rejected_faces"]:
+        rejected = frame["rejected_faces"][0]
+        raise FaceQualityError(QualityResult(False, rejected["reason"], rejected["scores"]))
     if len(encodings) == 0:
         raise ValueError("No face detected in image")
     if len(encodings) > 1:
@@ -58,177 +69,195 @@ def extract_single_embedding(image_array: np.ndarray):
 
 def check_already_marked(entity_id: int, entity_type: str) -> bool:
     """
-    Check if attendance already marked today.
+    Check if attendance already marked today (answered from the in-memory
+    presence set, loaded once per day).
     - entity_type: 'student' or 'teacher'
     """
-    conn = get_db()
-    today = date.today().isoformat()
-
-    if entity_type == "student":
-        row = conn.execute(
-            "SELECT id FROM student_attendance WHERE student_id = ? AND date = ? LIMIT 1",
-            (entity_id, today),
-        ).fetchone()
-    else:
-        row = conn.execute(
-            "SELECT id FROM teacher_attendance WHERE teacher_id = ? AND date = ? LIMIT 1",
-            (entity_id, today),
-        ).fetchone()
-
-    return row is not None
+    return get_presence().is_marked(entity_type, entity_id)
 
 
 # ---------------------------------------
 # Matching helpers
 # ---------------------------------------
 
-def _find_match_from_query(captured_embedding, rows, id_field_name: str, tolerance: float):
+def _find_match(captured_embedding, role: str, id_field_name: str, tolerance: float):
     """
-    Generic matcher: captured_embedding (list/np) vs DB rows
-    each row must contain: ['id', id_field_name, 'embedding', 'name', 'email']
+    Nearest enrolled person of `role` to captured_embedding (list/np), from
+    the shared embedding index (templates included). Returns
+    {id_field_name, name, email, distance, confidence} or None.
     """
-    if not rows:
+    person = match_people([captured_embedding], role, tolerance, conn=get_db())[0]
+    if person is None:
         return None
 
-    captured_np = np.array(captured_embedding)
-    best_match = None
-    best_confidence = 0.0
-
-    for row in rows:
-        stored_embedding = json.loads(row["embedding"])
-        stored_np = np.array(stored_embedding)
-
-        distance = face_recognition.face_distance([stored_np], captured_np)[0]
-        confidence = 1.0 - float(distance)
-
-        if distance <= tolerance and confidence > best_confidence:
-            best_confidence = confidence
-            best_match = {
-                "embedding_id": row["id"],
-                id_field_name: row[id_field_name],
-                "name": row["name"],
-                "email": row["email"],
-                "distance": float(distance),
-                "confidence": confidence,
-            }
-
-    return best_match
+    return {
+        id_field_name: person["id"],
+        "name": person["name"],
+        "email": person["email"],
+        "distance": person["distance"],
+        "confidence": 1.0 - person["distance"],
+    }
 
 
 def find_matching_student(captured_embedding, tolerance=0.5):
-    conn = get_db()
-    rows = conn.execute(
-        """
-        SELECT fe.id, fe.student_id, fe.embedding, s.name, s.email
-        FROM face_embeddings fe
-        JOIN students s ON fe.student_id = s.id
-        WHERE fe.is_active = 1
-        """
-    ).fetchall()
-
-    return _find_match_from_query(captured_embedding, rows, "student_id", tolerance)
+    return _find_match(captured_embedding, "student", "student_id", tolerance)
 
 
 def find_matching_teacher(captured_embedding, tolerance=0.5):
-    conn = get_db()
-    rows = conn.execute(
-        """
-        SELECT fe.id, fe.teacher_id, fe.embedding, t.name, t.email
-        FROM face_embeddings fe
-        JOIN teachers t ON fe.teacher_id = t.id
-        WHERE fe.is_active = 1
-        """
-    ).fetchall()
-
-    return _find_match_from_query(captured_embedding, rows, "teacher_id", tolerance)
+    return _find_match(captured_embedding, "teacher", "teacher_id", tolerance)
 
 
 # ---------------------------------------
-# Routes: Mark Student Attendance
+# Marking (shared by the sync and async routes)
 # ---------------------------------------
 
-@bp.route("/mark-student", methods=["POST"])
-@jwt_required()
-def mark_student_attendance():
-    """
-    Mark **student** attendance automatically from one photo.
+ROLES = {
+    # role: (matcher, id field, name field)
+    "student": (find_matching_student, "student_id", "student_name"),
+    "teacher": (find_matching_teacher, "teacher_id", "teacher_name"),
+}
 
-    JSON:
-    {
-      "image": "base64",
-      "tolerance": 0.5   // optional
-    }
-    """
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON body"}), 400
+INSERT_SQL = {
+    "student": "INSERT INTO student_attendance (student_id, date, status, marked_at) VALUES (?, ?, ?, ?)",
+    "teacher": "INSERT INTO teacher_attendance (teacher_id, date, status, marked_at) VALUES (?, ?, ?, ?)",
+}
 
-        image_data = data.get("image")
-        tolerance = float(data.get("tolerance", 0.5))
+EVENTS_TIMEOUT = 30   # seconds an SSE stream waits before the client should reconnect
 
-        if not image_data:
-            return jsonify({"error": "No image provided"}), 400
 
-        image_array = decode_base64_image(image_data)
-        captured_embedding = extract_single_embedding(image_array)
+def _mark_attendance(role, image_data, tolerance, client):
+    """
+    Recognise the single face in image_data and mark `role` attendance.
+    Returns (response body, HTTP status); never raises.
+    """
+    matcher, id_field, name_field = ROLES[role]
+    try:
+        captured_embedding = get_executor().run(extract_single_embedding, image_data, client=client)
 
-        match = find_matching_student(captured_embedding.tolist(), tolerance)
+        match = matcher(captured_embedding.tolist(), tolerance)
         if not match:
-            return jsonify({
+            return {
                 "success": False,
                 "error": "Face not recognized. Please try again or check camera.",
-            }), 200
+            }, 200
 
-        student_id = match["student_id"]
-        if check_already_marked(student_id, "student"):
-            return jsonify({
+        entity_id = match[id_field]
+        get_refresher().offer(role, entity_id, captured_embedding, match["distance"])
+        if check_already_marked(entity_id, role):
+            return {
                 "success": False,
                 "already_marked": True,
-                "student_id": student_id,
-                "student_name": match["name"],
+                id_field: entity_id,
+                name_field: match["name"],
                 "error": f"Attendance already marked today for {match['name']}",
-            }), 200
+            }, 200
 
         conn = get_db()
         today = date.today().isoformat()
         now_time = datetime.now().strftime("%H:%M:%S")
 
         try:
-            conn.execute(
-                """
-                INSERT INTO student_attendance (student_id, date, status, marked_at)
-                VALUES (?, ?, ?, ?)
-                """,
-                (student_id, today, "Present", now_time),
-            )
+            conn.execute(INSERT_SQL[role], (entity_id, today, "Present", now_time))
             conn.commit()
+            get_presence().add(role, entity_id, today)
         except Exception as e:
             conn.rollback()
-            return jsonify({"success": False, "error": f"Database error: {e}"}), 500
+            return {"success": False, "error": f"Database error: {e}"}, 500
 
-        return jsonify({
+        return {
             "success": True,
             "message": f"Attendance marked for {match['name']}",
-            "student_id": student_id,
-            "student_name": match["name"],
+            id_field: entity_id,
+            name_field: match["name"],
             "status": "Present",
             "date": today,
             "time": now_time,
             "confidence": match["confidence"],
-        }), 200
+        }, 200
 
+    except RecognitionUnavailable as e:
+        return {"success": False, "error": str(e), "retry_after": e.retry_after}, e.status
     except ValueError as ve:
-        return jsonify({"success": False, "error": str(ve)}), 400
+        return {"success": False, "error": str(ve)}, 400
     except Exception as e:
-        print("[AUTO_STUDENT_ERROR]", e)
-        return jsonify({"success": False, "error": "Internal server error"}), 500
+        print(f"[AUTO_{role.upper()}_ERROR]", e)
+        return {"success": False, "error": "Internal server error"}, 500
+
+
+def _respond(body, status):
+    response = jsonify(body)
+    response.status_code = status
+    if "retry_after" in body:
+        response.headers["Retry-After"] = str(body["retry_after"])
+    return response
+
+
+def _handle_mark(role):
+    image_data, data = get_image_payload("image")
+    try:
+        tolerance = float(data.get("tolerance", 0.5))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "tolerance must be a number"}), 400
+
+    if not image_data:
+        return jsonify({"error": "No image provided"}), 400
+
+    client = request_client(data)
+    if not _is_true(data.get("async", request.args.get("async"))):
+        return _respond(*_mark_attendance(role, image_data, tolerance, client))
+
+    if hasattr(image_data, "read"):
+        # The upload stream is closed once this request returns
+        image_data = image_data.read()
+
+    job_id = get_job_store().submit(
+        current_app._get_current_object(), _mark_attendance, role, image_data, tolerance, client
+    )
+    if job_id is None:
+        return _respond({"success": False, "error": "Too many pending jobs, retry shortly", "retry_after": 1}, 503)
+
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "pending",
+        "status_url": url_for("automatic_attendance.get_job", job_id=job_id),
+        "events_url": url_for("automatic_attendance.job_events", job_id=job_id),
+    }), 202
+
+
+def _is_true(value):
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
 
 
 # ---------------------------------------
-# Routes: Mark Teacher Attendance
+# Routes: Mark Student / Teacher Attendance
 # ---------------------------------------
 
+@bp.route("/mark-student", methods=["POST"])
+@jwt_required()
+def mark_student_attendance():
+    """
+    Mark **student** attendance automatically from one photo.
+
+    JSON:
+    {
+      "image": "base64",
+      "tolerance": 0.5,  // optional
+      "async": false     // optional, see below
+    }
+
+    Also accepts a raw image/jpeg body or a multipart "image" file part.
+
+    With "async": true (or ?async=1) the photo is queued and 202
+    { "job_id", "status_url", "events_url" } is returned immediately; the
+    usual response body is then available from GET /jobs/<job_id> or as a
+    server-sent event from GET /jobs/<job_id>/events.
+    """
+    return _handle_mark("student")
+
+
 @bp.route("/mark-teacher", methods=["POST"])
 @jwt_required()
 def mark_teacher_attendance():
@@ -238,70 +267,69 @@ def mark_teacher_attendance():
     JSON:
     {
       "image": "base64",
-      "tolerance": 0.5
+      "tolerance": 0.5,
+      "async": false
     }
-    """
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON body"}), 400
-
-        image_data = data.get("image")
-        tolerance = float(data.get("tolerance", 0.5))
 
-        if not image_data:
-            return jsonify({"error": "No image provided"}), 400
+    Also accepts a raw image/jpeg body or a multipart "image" file part.
+    Async mode works as for /mark-student.
+    """
+    return _handle_mark("teacher")
 
-        image_array = decode_base64_image(image_data)
-        captured_embedding = extract_single_embedding(image_array)
 
-        match = find_matching_teacher(captured_embedding.tolist(), tolerance)
-        if not match:
-            return jsonify({
-                "success": False,
-                "error": "Face not recognized. Please try again or check camera.",
-            }), 200
+# ---------------------------------------
+# Routes: Async job results
+# ---------------------------------------
 
-        teacher_id = match["teacher_id"]
-        if check_already_marked(teacher_id, "teacher"):
-            return jsonify({
-                "success": False,
-                "already_marked": True,
-                "teacher_id": teacher_id,
-                "teacher_name": match["name"],
-                "error": f"Attendance already marked today for {match['name']}",
-            }), 200
+def _job_body(job_id, job):
+    body = {"job_id": job_id, "status": job["status"]}
+    if job["status"] == "done":
+        body["result"] = job["result"]
+        body["http_status"] = job["http_status"]
+    return body
 
-        conn = get_db()
-        today = date.today().isoformat()
-        now_time = datetime.now().strftime("%H:%M:%S")
 
-        try:
-            conn.execute(
-                """
-                INSERT INTO teacher_attendance (teacher_id, date, status, marked_at)
-                VALUES (?, ?, ?, ?)
-                """,
-                (teacher_id, today, "Present", now_time),
-            )
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            return jsonify({"success": False, "error": f"Database error: {e}"}), 500
+@bp.route("/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def get_job(job_id):
+    """
+    Poll an async mark job. "result" / "http_status" hold what the sync
+    call would have returned once "status" is "done". Results are kept for
+    JOB_TTL seconds after the job finishes (404 afterwards).
+    """
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown or expired job"}), 404
+    return jsonify(_job_body(job_id, job)), 200
 
-        return jsonify({
-            "success": True,
-            "message": f"Attendance marked for {match['name']}",
-            "teacher_id": teacher_id,
-            "teacher_name": match["name"],
-            "status": "Present",
-            "date": today,
-            "time": now_time,
-            "confidence": match["confidence"],
-        }), 200
 
-    except ValueError as ve:
-        return jsonify({"success": False, "error": str(ve)}), 400
-    except Exception as e:
-        print("[AUTO_TEACHER_ERROR]", e)
-        return jsonify({"success": False, "error": "Internal server error"}), 500
+@bp.route("/jobs/<job_id>/events", methods=["GET"])
+@jwt_required()
+def job_events(job_id):
+    """
+    Server-sent events for an async mark job: a single "result" event with
+    the same body as GET /jobs/<job_id>, then the stream closes. Keep-alive
+    comments are sent while waiting; after EVENTS_TIMEOUT seconds the stream
+    ends with a "timeout" event and the client should reconnect or poll.
+    """
+    store = get_job_store()
+    if store.get(job_id) is None:
+        return jsonify({"success": False, "error": "Unknown or expired job"}), 404
+
+    def stream():
+        deadline = time.monotonic() + EVENTS_TIMEOUT
+        while True:
+            job = store.wait(job_id, min(5.0, max(0.0, deadline - time.monotonic())))
+            if job is None:
+                yield "event: error\ndata: {\"error\": \"Unknown or expired job\"}\n\n"
+                return
+            if job["status"] == "done":
+                yield f"event: result\ndata: {json.dumps(_job_body(job_id, job))}\n\n"
+                return
+            if time.monotonic() >= deadline:
+                yield f"event: timeout\ndata: {json.dumps(_job_body(job_id, job))}\n\n"
+                return
+            yield ": keep-alive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
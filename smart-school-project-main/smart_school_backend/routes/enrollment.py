@@ -1,43 +1,42 @@
-from flask import Blueprint, request, jsonify
-import numpy as np
-import json
+import os
+import tempfile
 
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt
 from smart_school_backend.utils.db import get_db
+from smart_school_backend.utils.image_input import get_image_payload
 from smart_school_backend.face_engine.encoder import generate_embedding
-from smart_school_backend.models.face_recognition import store_face_embedding, load_all_embeddings
+from smart_school_backend.models.face_recognition import PEOPLE_TABLES, enroll_face_embedding, add_face_template
+from smart_school_backend.face_engine.index import get_index
+from smart_school_backend.face_engine.quality import FaceQualityError
+from smart_school_backend.face_engine.workers import (
+    RecognitionUnavailable,
+    get_executor,
+    request_client,
+    unavailable_response,
+)
+from smart_school_backend.face_engine.bulk_enroll import start_bulk_job, get_job
 
 enrollment_bp = Blueprint("enrollment", __name__)
 
 @enrollment_bp.route("/enroll", methods=["POST"])
 def enroll_face():
     try:
-        data = request.json
+        image, data = get_image_payload("image")
 
-        image = data.get("image")
         user_id = data.get("user_id")
         role = data.get("role")
 
         if not image or not user_id or not role:
             return jsonify({"error": "Missing required fields"}), 400
 
-        embedding = generate_embedding(image)
+        try:
+            embedding = get_executor().run(generate_embedding, image, client=request_client(data))
+        except FaceQualityError as e:
+            return jsonify({"error": str(e), "reason": e.reason, "scores": e.scores}), 400
         if embedding is None:
             return jsonify({"error": "No face detected"}), 400
 
-        # Check for existing faces
-        existing_embeddings = load_all_embeddings()
-        for existing in existing_embeddings:
-            dist = np.linalg.norm(embedding - existing["embedding"])
-            if dist < 0.6:
-                return jsonify({
-                    "error": "This face is already enrolled.",
-                    "existing_user": {
-                        "person_id": existing["person_id"],
-                        "role": existing["role"],
-                        "name": existing["name"]
-                    }
-                }), 409
-
         conn = get_db()
         cur = conn.cursor()
 
@@ -62,8 +61,17 @@ def enroll_face():
             class_name = None
             section = None
 
-        # Use the imported function to store the embedding
-        store_face_embedding(role, user_id, name, email, class_name, section, embedding)
+        # Duplicate check (nearest enrolled face) and store in one step
+        existing = enroll_face_embedding(role, user_id, name, email, class_name, section, embedding)
+        if existing is not None:
+            return jsonify({
+                "error": "This face is already enrolled.",
+                "existing_user": {
+                    "person_id": existing["person_id"],
+                    "role": existing["role"],
+                    "name": existing["name"]
+                }
+            }), 409
 
         print(f"Successfully enrolled face for person_id: {user_id}, role: {role}")
         return jsonify({
@@ -73,6 +81,115 @@ def enroll_face():
             "role": role
         })
 
+    except RecognitionUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         print("Enroll error:", e)
         return jsonify({"error": "Enrollment failed"}), 500
+
+
+@enrollment_bp.route("/templates", methods=["POST"])
+@jwt_required()
+def add_template():
+    """
+    Add another photo (template) for an already enrolled person, e.g. a
+    different angle or lighting. Fields: image, user_id, role.
+    Templates beyond FACE_MAX_TEMPLATES are pruned, most redundant first.
+    Admins, or the person themself (matched by login email and role).
+    """
+    try:
+        image, data = get_image_payload("image")
+
+        user_id = data.get("user_id")
+        role = data.get("role")
+
+        if not image or not user_id or not role:
+            return jsonify({"error": "Missing required fields"}), 400
+        if role not in PEOPLE_TABLES:
+            return jsonify({"error": "role must be 'student' or 'teacher'"}), 400
+
+        person = get_db().execute(
+            f"SELECT email FROM {PEOPLE_TABLES[role]} WHERE id = ?", (user_id,)
+        ).fetchone()
+
+        claims = get_jwt()
+        is_self = (
+            person is not None and person["email"]
+            and claims.get("role") == role and claims.get("email") == person["email"]
+        )
+        if claims.get("role") != "admin" and not is_self:
+            return jsonify({"error": "Only admins or the person themself can add templates"}), 403
+        if person is None:
+            return jsonify({"error": f"User with id {user_id} and role {role} not found"}), 404
+
+        try:
+            embedding = get_executor().run(generate_embedding, image, client=request_client(data))
+        except FaceQualityError as e:
+            return jsonify({"error": str(e), "reason": e.reason, "scores": e.scores}), 400
+        if embedding is None:
+            return jsonify({"error": "No face detected"}), 400
+
+        # The new photo must not look like somebody else
+        index = get_index()
+        index.ensure_loaded(get_db())
+        match = index.search_exact([embedding], threshold=0.6)[0]
+        if match and (match["person_id"], match["role"]) != (str(user_id), role):
+            return jsonify({
+                "error": "This face matches another enrolled person.",
+                "existing_user": {"person_id": match["person_id"], "role": match["role"]}
+            }), 409
+
+        added = add_face_template(user_id, embedding, role=role)
+        if added is None:
+            return jsonify({"error": f"No enrolled face for {role} {user_id}; enroll first"}), 404
+
+        template_id, pruned = added
+        return jsonify({
+            "status": "success",
+            "person_id": user_id,
+            "template_id": template_id,
+            "pruned": pruned
+        })
+
+    except RecognitionUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        print("Add template error:", e)
+        return jsonify({"error": "Adding template failed"}), 500
+
+
+@enrollment_bp.route("/enroll-bulk", methods=["POST"])
+@jwt_required()
+def enroll_bulk():
+    """
+    Admin only. Multipart upload of a ZIP ("archive") of photos named by
+    student id_code. Encoding runs in the background; poll
+    GET /enroll-bulk/<job_id> for progress and the final report.
+    Form fields: dry_run=true to only produce the report.
+    """
+    if get_jwt().get("role") != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    upload = request.files.get("archive")
+    if upload is None:
+        return jsonify({"error": "ZIP archive is required"}), 400
+
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    with os.fdopen(fd, "wb") as f:
+        upload.save(f)
+
+    dry_run = request.form.get("dry_run", "").lower() in ("1", "true", "yes")
+    job_id = start_bulk_job(path, cleanup=True, dry_run=dry_run)
+    return jsonify({"job_id": job_id, "status": "running"}), 202
+
+
+@enrollment_bp.route("/enroll-bulk/<job_id>", methods=["GET"])
+@jwt_required()
+def enroll_bulk_status(job_id):
+    if get_jwt().get("role") != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
@@ -6,25 +6,43 @@ Real-Time Face Recognition Attendance System
 Endpoint (after prefix):
 - POST /api/realtime-attendance/process-frame
 
-Takes a single frame (base64), detects faces, matches them, and
+Takes a single frame (base64 JSON, raw image/jpeg body or multipart), detects faces, matches them, and
 (optionally) marks attendance for recognized students.
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required
-from datetime import datetime, date
-from io import BytesIO
-import base64
-import json
-
+import time
 import numpy as np
-from PIL import Image
-import face_recognition
 
 try:
     from smart_school_backend.utils.db import get_db
+    from smart_school_backend.utils.image_input import get_image_payload
+    from smart_school_backend.face_engine.tracker import get_tracker
+    from smart_school_backend.utils.attendance_queue import get_attendance_queue
+    from smart_school_backend.utils.presence import get_presence
+    from smart_school_backend.face_engine.refresh import get_refresher
+    from smart_school_backend.face_engine.encoder import detect_faces, encode_faces, process_frame as process_frame_task
+    from smart_school_backend.face_engine.frame_cache import get_frame_cache
+    from smart_school_backend.face_engine.motion import get_motion_gate
+    from smart_school_backend.face_engine.scheduler import FrameSuperseded, get_frame_scheduler
+    from smart_school_backend.face_engine.index import get_index
+    from smart_school_backend.models.face_recognition import match_people
+    from smart_school_backend.face_engine.workers import RecognitionUnavailable, get_executor, request_client, unavailable_response
 except ImportError:
     from utils.db import get_db
+    from utils.image_input import get_image_payload
+    from face_engine.tracker import get_tracker
+    from utils.attendance_queue import get_attendance_queue
+    from utils.presence import get_presence
+    from face_engine.refresh import get_refresher
+    from face_engine.encoder import detect_faces, encode_faces, process_frame as process_frame_task
+    from face_engine.frame_cache import get_frame_cache
+    from face_engine.motion import get_motion_gate
+    from face_engine.scheduler import FrameSuperseded, get_frame_scheduler
+    from face_engine.index import get_index
+    from models.face_recognition import match_people
+    from face_engine.workers import RecognitionUnavailable, get_executor, request_client, unavailable_response
 
 bp = Blueprint("realtime_attendance", __name__)
 
@@ -33,170 +51,249 @@ bp = Blueprint("realtime_attendance", __name__)
 # Image / Detection helpers
 # ---------------------------------------
 
-def decode_base64_image(image_data: str) -> np.ndarray:
-    """Decode base64 (with or without data URL header) → RGB numpy array."""
-    if not image_data:
-        raise ValueError("No frame data provided")
+def process_frame_for_faces(image_data, tracker=None, client=None):
+    """
+    Run the shared "realtime" face pipeline (downscale, detect, encode) on the
+    recognition executor. Bounding boxes are returned in original frame coordinates.
 
-    if "," in image_data:
-        image_data = image_data.split(",", 1)[1]
+    With a session tracker, only faces on new / unidentified / re-verification
+    due tracks are encoded; the others get None in "face_encodings" and reuse
+    the identity stored on their track (returned in "tracks").
 
-    img_bytes = base64.b64decode(image_data)
-    img = Image.open(BytesIO(img_bytes)).convert("RGB")
-    return np.array(img)
+    Faces failing the quality gate are not encoded and are returned in
+    "rejected_faces" ({box, reason}) instead.
 
+    Near-identical consecutive frames from the same client (session_id) reuse
+    the previous frame's detections and encodings (face_engine/frame_cache.py);
+    "cached" says whether detection was skipped.
 
-def process_frame_for_faces(image_data: str):
-    """
-    Downscale frame for speed, detect faces, return locations & encodings.
-    Scales bounding boxes back to original size.
+    RecognitionUnavailable (executor busy / timed out) is raised, not wrapped.
     """
     try:
-        full_image = decode_base64_image(image_data)
-        original_height, original_width = full_image.shape[:2]
-
-        # Resize for faster processing
-        scale_factor = 0.25
-        small_image = np.ascontiguousarray(
-            np.array(
-                Image.fromarray(full_image).resize(
-                    (int(original_width * scale_factor), int(original_height * scale_factor))
-                )
+        if not image_data:
+            raise ValueError("No frame data provided")
+
+        executor = get_executor()
+        cache = get_frame_cache()
+        cache_key = ("realtime", client, tracker is not None)
+        fingerprint = cache.fingerprint(image_data) if client is not None else None
+        hit, cached = cache.lookup(cache_key, fingerprint)
+
+        if tracker is None:
+            if not hit:
+                cached = executor.run(process_frame_task, image_data, "realtime", client=client)
+                cache.store(cache_key, fingerprint, cached)
+            return {"success": True, **cached, "cached": hit}
+
+        if hit:
+            image_np = image_data
+            scale, (height, width), small_locations = cached["scale"], cached["dimensions"], cached["locations"]
+            outcomes = dict(cached["outcomes"])
+        else:
+            image_np, scale, (height, width), small_locations = executor.run(
+                detect_faces, image_data, "realtime", client=client
             )
-        )
-
-        # Detect face locations & encodings
-        face_locations = face_recognition.face_locations(small_image)
-        face_encodings = face_recognition.face_encodings(small_image, face_locations)
-
-        # Scale boxes back to original size
-        scaled_locations = []
-        for (top, right, bottom, left) in face_locations:
-            scaled_locations.append(
-                (
-                    int(top / scale_factor),
-                    int(right / scale_factor),
-                    int(bottom / scale_factor),
-                    int(left / scale_factor),
-                )
+            outcomes = {}
+        face_locations = [tuple(int(v / scale) for v in box) for box in small_locations]
+
+        now = time.monotonic()
+        with tracker.lock:
+            tracks = tracker.update(face_locations)
+
+        to_encode = [i for i, track in enumerate(tracks) if track.needs_encoding(now)]
+        missing = [i for i in to_encode if i not in outcomes]
+        if missing:
+            # Tracker state stays in this process; only due faces go back to a worker
+            quality, encoded = executor.run(
+                encode_faces, image_np, [small_locations[i] for i in missing], scale, "realtime",
+                client=client,
             )
-
+            encoded = iter(encoded)
+            for i, result in zip(missing, quality):
+                outcomes[i] = (result, next(encoded) if result.ok else None)
+
+        if not hit or missing:
+            # Cache the detections even when nothing was encoded (empty scene, tracked faces)
+            cache.store(cache_key, fingerprint, {
+                "scale": scale, "dimensions": (height, width), "locations": small_locations, "outcomes": outcomes,
+            })
+
+        rejected = {i: outcomes[i][0] for i in to_encode if not outcomes[i][0].ok}
+        face_encodings = [None] * len(tracks)
+        for i in to_encode:
+            face_encodings[i] = outcomes[i][1]
+
+        kept = [i for i in range(len(tracks)) if i not in rejected]
         return {
             "success": True,
-            "face_locations": scaled_locations,
-            "face_encodings": [enc.tolist() for enc in face_encodings],
-            "original_dimensions": {"height": original_height, "width": original_width},
+            "face_locations": [face_locations[i] for i in kept],
+            "face_encodings": [face_encodings[i] for i in kept],
+            "tracks": [tracks[i] for i in kept],
+            "rejected_faces": [
+                {"box": face_locations[i], "reason": result.reason} for i, result in rejected.items()
+            ],
+            "original_dimensions": {"height": height, "width": width},
+            "cached": hit,
         }
+    except RecognitionUnavailable:
+        raise
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def get_all_active_face_embeddings():
+def find_matching_faces(captured_embeddings, tolerance=0.52):
     """
-    Fetch all active embeddings (currently **students only**; you can extend to teachers).
-    Returns list of dict: { id, entity_id, embedding, name, type }
+    Best enrolled student ≤ tolerance (or None) for each captured embedding,
+    from one batched search of the shared embedding index.
     """
-    try:
-        conn = get_db()
-        c = conn.cursor()
-
-        # Students
-        c.execute(
-            """
-            SELECT fe.id, fe.student_id, fe.embedding, s.name, 'student' as type
-            FROM face_embeddings fe
-            JOIN students s ON fe.student_id = s.id
-            WHERE fe.is_active = 1
-            """
-        )
-
-        embeddings = []
-        for row in c.fetchall():
-            embedding_data = json.loads(row["embedding"])
-            embeddings.append(
-                {
-                    "id": row["id"],
-                    "entity_id": row["student_id"],
-                    "embedding": embedding_data,
-                    "name": row["name"],
-                    "type": row["type"],
-                }
-            )
-
-        return embeddings
-    except Exception as e:
-        print(f"[REALTIME] Error getting embeddings: {e}")
+    if not captured_embeddings:
         return []
 
-
-def find_matching_face(captured_embedding, all_embeddings, tolerance=0.52):
-    """Find best matching face ≤ tolerance."""
-    if not all_embeddings:
-        return None
-
     try:
-        captured_np = np.array(captured_embedding)
-        best_match = None
-        best_distance = float("inf")
-
-        for emb in all_embeddings:
-            stored_np = np.array(emb["embedding"])
-            distance = face_recognition.face_distance([stored_np], captured_np)[0]
-
-            if distance < best_distance and distance <= tolerance:
-                best_distance = distance
-                best_match = {
-                    "name": emb["name"],
-                    "entity_id": emb["entity_id"],
-                    "type": emb["type"],
-                    "distance": float(distance),
-                    "confidence": float(1 - distance),
-                }
-
-        return best_match
+        people = match_people(np.stack(captured_embeddings), "student", tolerance, conn=get_db())
     except Exception as e:
         print(f"[REALTIME] Error finding match: {e}")
-        return None
+        return [None] * len(captured_embeddings)
+
+    return [
+        {
+            "name": person["name"],
+            "entity_id": person["id"],
+            "type": "student",
+            "distance": person["distance"],
+            "confidence": float(1 - person["distance"]),
+        } if person else None
+        for person in people
+    ]
+
+
+def find_matching_face(captured_embedding, tolerance=0.52):
+    """Find best matching face ≤ tolerance."""
+    return find_matching_faces([captured_embedding], tolerance)[0]
 
 
 def check_already_marked_today(student_id: int) -> bool:
-    """Check if student attendance already marked today."""
+    """Check if student attendance already marked (or queued) today."""
     try:
-        conn = get_db()
-        c = conn.cursor()
-        today = date.today().isoformat()
-
-        c.execute(
-            """
-            SELECT id FROM student_attendance
-            WHERE student_id = ? AND date = ?
-            """,
-            (student_id, today),
-        )
-        return c.fetchone() is not None
+        return get_presence().is_marked("student", student_id)
     except Exception:
         return False
 
 
 def mark_attendance_record(student_id: int, status: str = "present") -> bool:
-    """Insert attendance row for the student."""
-    try:
-        conn = get_db()
-        c = conn.cursor()
-        today = date.today().isoformat()
-
-        c.execute(
-            """
-            INSERT INTO student_attendance (student_id, date, status)
-            VALUES (?, ?, ?)
-            """,
-            (student_id, today, status),
+    """
+    Queue a present event for the student. The write-behind queue batches
+    inserts, so this never opens a write transaction on the request thread.
+    """
+    return get_attendance_queue().submit("student", student_id, status)
+
+
+# ---------------------------------------
+# Frame recognition (HTTP and stream)
+# ---------------------------------------
+
+def recognize_frame(frame_data, tolerance=0.52, session_id=None, client=None):
+    """
+    Motion gate, face pipeline, matching and attendance marking for one
+    frame. Returns (response body, HTTP status) as documented on
+    process_frame; raises RecognitionUnavailable when the executor is busy.
+    Shared by POST /process-frame and the streaming channel.
+    """
+    gate = get_motion_gate()
+    gate_key = (client, tolerance)
+    thumb, last_body = gate.check(gate_key, frame_data) if client is not None else (None, None)
+    if last_body is not None:
+        return {**last_body, "no_change": True}, 200
+
+    tracker = get_tracker(session_id) if session_id else None
+    frame_result = process_frame_for_faces(frame_data, tracker, client=client)
+    if not frame_result["success"]:
+        return frame_result, 400
+
+    face_locations = frame_result["face_locations"]
+    face_encodings = frame_result["face_encodings"]
+    tracks = frame_result.get("tracks") or [None] * len(face_locations)
+
+    # Match every newly encoded face of the frame in one go
+    to_match = [i for i, encoding in enumerate(face_encodings) if encoding is not None]
+    matches = {}
+    if to_match:
+        found = find_matching_faces([face_encodings[i] for i in to_match], tolerance)
+        matches = dict(zip(to_match, found))
+
+    faces = []
+    for i, (face_box, face_encoding, track) in enumerate(zip(face_locations, face_encodings, tracks)):
+        if face_encoding is None:
+            # Identified on an earlier frame of this session
+            faces.append({**track.identity, "box": face_box, "tracked": True})
+            continue
+
+        match = matches[i]
+
+        if match:
+            name = match["name"]
+            color = "green"
+            get_refresher().offer(match["type"], match["entity_id"], face_encoding, match["distance"], box=face_box)
+
+            already_marked = check_already_marked_today(match["entity_id"])
+            marked_now = False
+
+            if not already_marked:
+                marked_now = mark_attendance_record(match["entity_id"])
+
+            faces.append(
+                {
+                    "box": face_box,
+                    "name": name,
+                    "color": color,
+                    "confidence": match["confidence"],
+                    "marked": bool(marked_now or already_marked),
+                    "already_marked": bool(already_marked),
+                }
+            )
+        else:
+            faces.append(
+                {
+                    "box": face_box,
+                    "name": "Unknown",
+                    "color": "red",
+                    "confidence": 0.0,
+                    "marked": False,
+                    "already_marked": False,
+                }
+            )
+
+        if track is not None:
+            # Later frames reuse this result; by then the mark is not new
+            track.assign({**faces[-1], "already_marked": faces[-1]["marked"]} if match else None)
+
+    for rejected in frame_result.get("rejected_faces", []):
+        # Not encoded: blurry / small / dark / turned away
+        faces.append(
+            {
+                "box": rejected["box"],
+                "name": "Unknown",
+                "color": "red",
+                "confidence": 0.0,
+                "marked": False,
+                "already_marked": False,
+                "quality": rejected["reason"],
+            }
         )
-        conn.commit()
-        return True
-    except Exception as e:
-        print(f"[REALTIME] Error marking attendance: {e}")
-        return False
+
+    body = {
+        "success": True,
+        "faces": faces,
+        "frame_dimensions": frame_result["original_dimensions"],
+        "cached": frame_result.get("cached", False),
+    }
+    # Replayed while nothing moves; a mark made on this frame is not new then
+    gate.update(gate_key, thumb, {
+        **body,
+        "faces": [{**face, "already_marked": face["marked"]} for face in faces],
+        "cached": True,
+    })
+    return {**body, "no_change": False}, 200
 
 
 # ---------------------------------------
@@ -212,9 +309,25 @@ def process_frame():
     Request JSON:
     {
       "frame": "base64_encoded_image",
-      "tolerance": 0.52   // optional
+      "tolerance": 0.52,        // optional
+      "session_id": "kiosk-3"   // optional, enables face tracking
     }
 
+    The frame may also be sent as a raw image/jpeg body (tolerance in the
+    query string) or as a multipart "frame" file part.
+
+    With a session_id, faces are tracked across frames and an identified
+    face is only re-encoded every few seconds ("tracked": true otherwise).
+
+    With a session_id, frames of one session are processed one at a time and
+    only the newest waits (face_engine/scheduler.py): a frame replaced by a
+    newer one before it started is answered 409 { "superseded": true }
+    without being processed, and "dropped" counts the session's dropped frames.
+
+    A frame with no significant change since the session's last processed
+    frame is not run through the pipeline at all (face_engine/motion.py):
+    the last faces are returned again with "no_change": true.
+
     Response:
     {
       "success": true,
@@ -225,76 +338,38 @@ def process_frame():
           "color": "green" | "red",
           "confidence": 0.95,
           "marked": true/false,
-          "already_marked": true/false
+          "already_marked": true/false,
+          "quality": "too_blurry"   // only on faces skipped by the quality gate
         }
       ],
-      "frame_dimensions": { "height": ..., "width": ... }
+      "frame_dimensions": { "height": ..., "width": ... },
+      "cached": false,    // true when detection was reused from a near-identical frame
+      "no_change": false, // true when the frame was skipped by the motion gate
+      "dropped": 0        // with a session_id: frames of this session dropped so far
     }
     """
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON body"}), 400
-
-        frame_data = data.get("frame")
+        frame_data, data = get_image_payload("frame", file_field="frame")
         tolerance = float(data.get("tolerance", 0.52))
+        session_id = data.get("session_id")
 
         if not frame_data:
             return jsonify({"error": "No frame data provided"}), 400
 
-        frame_result = process_frame_for_faces(frame_data)
-        if not frame_result["success"]:
-            return jsonify(frame_result), 400
-
-        face_locations = frame_result["face_locations"]
-        face_encodings = frame_result["face_encodings"]
-
-        all_embeddings = get_all_active_face_embeddings()
-
-        faces = []
-        for face_box, face_encoding in zip(face_locations, face_encodings):
-            match = find_matching_face(face_encoding, all_embeddings, tolerance)
-
-            if match:
-                name = match["name"]
-                color = "green"
-
-                already_marked = check_already_marked_today(match["entity_id"])
-                marked_now = False
-
-                if not already_marked:
-                    marked_now = mark_attendance_record(match["entity_id"])
-
-                faces.append(
-                    {
-                        "box": face_box,
-                        "name": name,
-                        "color": color,
-                        "confidence": match["confidence"],
-                        "marked": bool(marked_now or already_marked),
-                        "already_marked": bool(already_marked),
-                    }
-                )
-            else:
-                faces.append(
-                    {
-                        "box": face_box,
-                        "name": "Unknown",
-                        "color": "red",
-                        "confidence": 0.0,
-                        "marked": False,
-                        "already_marked": False,
-                    }
-                )
-
-        return jsonify(
-            {
-                "success": True,
-                "faces": faces,
-                "frame_dimensions": frame_result["original_dimensions"],
-            }
-        ), 200
+        if not session_id:
+            body, status = recognize_frame(frame_data, tolerance, client=request_client(data))
+            return jsonify(body), status
+
+        # One frame per session at a time; a newer frame replaces one still waiting
+        try:
+            with get_frame_scheduler().turn(session_id) as dropped:
+                body, status = recognize_frame(frame_data, tolerance, session_id, client=session_id)
+        except FrameSuperseded as e:
+            return jsonify({"success": False, "superseded": True, "dropped": e.dropped, "error": str(e)}), 409
+        return jsonify({**body, "dropped": dropped}), status
 
+    except RecognitionUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         print("[REALTIME] process_frame error:", e)
         return jsonify({"error": str(e)}), 500
@@ -303,5 +378,6 @@ def process_frame():
 @bp.route("/health", methods=["GET"])
 def health_check():
     """Simple health check for realtime attendance."""
-    embeddings = get_all_active_face_embeddings()
-    return jsonify({"status": "ok", "enrolled_faces": len(embeddings)}), 200
+    index = get_index()
+    index.ensure_loaded(get_db())
+    return jsonify({"status": "ok", "enrolled_faces": index.count("student")}), 200
@@ -0,0 +1,201 @@
+# smart_school_backend/routes/realtime_stream.py
+
+"""
+Streaming realtime attendance over a WebSocket.
+
+URL: ws(s)://<host>/api/realtime-attendance/stream
+
+One long-lived connection per kiosk instead of one HTTP request per frame:
+the kiosk authenticates once, then sends binary JPEG frames and receives
+results as they become ready.
+
+Protocol (JSON text messages, frames as binary messages):
+
+  client -> {"token": "<access JWT>", "session_id": "kiosk-3", "tolerance": 0.52}
+  server -> {"type": "ready", "session_id": "kiosk-3"}
+  client -> <JPEG bytes>                          (any rate)
+  server -> {"type": "result", "seq": 17, "dropped": 3, "latency_ms": 48,
+             ...same body as POST /process-frame...}
+  server -> {"type": "error", "seq": 17, "error": "...", "retry_after": 1}
+  client -> {"type": "ping"}  /  server -> {"type": "pong"}
+
+Frames are numbered from 1 in arrival order ("seq"). They are not queued:
+while one frame is processed, a newer frame replaces the one waiting and
+the replaced frames are counted in "dropped", so a kiosk that sends faster
+than the server keeps getting results for its freshest frame.
+
+Needs flask-sock. Without it the channel is not registered and kiosks
+keep using POST /api/realtime-attendance/process-frame.
+"""
+
+import json
+import threading
+import time
+import uuid
+
+from flask import current_app
+from flask_jwt_extended import decode_token
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
+
+try:
+    from smart_school_backend.face_engine.workers import RecognitionUnavailable
+    from smart_school_backend.routes.realtime_attendance import recognize_frame
+except ImportError:
+    from face_engine.workers import RecognitionUnavailable
+    from routes.realtime_attendance import recognize_frame
+
+STREAM_PATH = "/api/realtime-attendance/stream"
+AUTH_TIMEOUT = 10                       # seconds to send the auth message
+MAX_FRAME_BYTES = 2 * 1024 * 1024
+
+
+class FrameSlot:
+    """Single-frame mailbox: put() replaces a frame that has not been taken yet."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def take(self):
+        """Wait for the newest frame; None once the slot is closed."""
+        with self._cond:
+            while self._item is None and not self._closed:
+                self._cond.wait()
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._item = None
+            self._cond.notify_all()
+
+
+class StreamSession:
+    def __init__(self, app, ws, session_id, tolerance, client):
+        self.app = app
+        self.ws = ws
+        self.session_id = session_id
+        self.tolerance = tolerance
+        self.client = client
+        self.slot = FrameSlot()
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        data = json.dumps(message, default=float)
+        with self._send_lock:
+            self.ws.send(data)
+
+    def process_frames(self):
+        """Worker thread: recognise the newest frame, send the result, repeat."""
+        while True:
+            item = self.slot.take()
+            if item is None:
+                return
+            seq, received_at, frame = item
+            try:
+                with self.app.app_context():
+                    body, status = recognize_frame(frame, self.tolerance, self.session_id, client=self.client)
+                message = {"type": "result" if status == 200 else "error", **body}
+            except RecognitionUnavailable as e:
+                message = {"type": "error", "error": str(e), "retry_after": e.retry_after}
+            except Exception as e:
+                print(f"[STREAM] Frame {seq} of {self.client} failed: {e}")
+                message = {"type": "error", "error": "Frame processing failed"}
+
+            message.update(
+                seq=seq,
+                dropped=self.slot.dropped,
+                latency_ms=round((time.monotonic() - received_at) * 1000, 1),
+            )
+            try:
+                self.send(message)
+            except ConnectionClosed:
+                return
+
+    def receive_frames(self):
+        """Connection thread: put binary frames in the slot and answer control messages."""
+        seq = 0
+        while True:
+            message = self.ws.receive()
+            if isinstance(message, str):
+                try:
+                    control = json.loads(message)
+                except ValueError:
+                    control = {}
+                if control.get("type") == "ping":
+                    self.send({"type": "pong"})
+                continue
+            if not message:
+                continue
+            if len(message) > MAX_FRAME_BYTES:
+                self.send({"type": "error", "error": "Frame too large"})
+                continue
+            seq += 1
+            self.slot.put((seq, time.monotonic(), bytes(message)))
+
+
+def _authenticate(ws):
+    """Read the first message and verify its access token. Returns the message dict."""
+    message = ws.receive(timeout=AUTH_TIMEOUT)
+    if not isinstance(message, str):
+        raise ValueError("first message must be the JSON auth message")
+    hello = json.loads(message)
+    claims = decode_token(hello.get("token") or "")
+    if claims.get("type") != "access":
+        raise ValueError("an access token is required")
+    return hello
+
+
+def stream(ws):
+    try:
+        hello = _authenticate(ws)
+        tolerance = float(hello.get("tolerance", 0.52))
+    except Exception as e:
+        ws.send(json.dumps({"type": "error", "error": f"Authentication failed: {e}"}))
+        ws.close()
+        return
+
+    session_id = hello.get("session_id")
+    # Without a session_id the connection is its own client (not the remote
+    # address, which a whole school may share behind a NAT)
+    session = StreamSession(
+        current_app._get_current_object(), ws, session_id, tolerance, session_id or f"ws-{uuid.uuid4().hex[:12]}"
+    )
+    worker = threading.Thread(target=session.process_frames, name=f"stream-{session.client}", daemon=True)
+    worker.start()
+    print(f"[STREAM] {session.client} connected")
+
+    try:
+        session.send({"type": "ready", "session_id": session_id})
+        session.receive_frames()
+    except ConnectionClosed:
+        pass
+    finally:
+        session.slot.close()
+        worker.join(timeout=5)
+        print(f"[STREAM] {session.client} disconnected, {session.slot.dropped} frames dropped")
+
+
+def init_stream(app):
+    """Register the WebSocket route on app if flask-sock is installed."""
+    if Sock is None:
+        print("[STREAM] flask-sock not installed; realtime stream disabled")
+        return None
+    sock = Sock(app)
+    sock.route(STREAM_PATH)(stream)
+    return sock
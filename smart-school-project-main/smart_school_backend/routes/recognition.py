@@ -1,48 +1,92 @@
+import os
+
 from flask import Blueprint, request, jsonify
-import sqlite3
-import numpy as np
-from smart_school_backend.face_engine.encoder import generate_embedding
+from smart_school_backend.face_engine.encoder import (
+    generate_embedding,
+    generate_embedding_from_crop,
+    generate_embeddings_batch,
+)
+from smart_school_backend.face_engine.index import get_index
+from smart_school_backend.face_engine.scope import scope_from_params
+from smart_school_backend.face_engine.refresh import get_refresher
+from smart_school_backend.face_engine.quality import FaceQualityError
+from smart_school_backend.face_engine.frame_cache import get_frame_cache
+from smart_school_backend.face_engine.workers import (
+    RecognitionUnavailable,
+    get_executor,
+    request_client,
+    unavailable_response,
+)
 from smart_school_backend.utils.db import get_db
+from smart_school_backend.utils.image_input import get_image_payload, get_face_box
 
 recognition_bp = Blueprint("recognition", __name__)
 
+# One batch is one executor task; cap it so its (frame-scaled) timeout stays bounded
+MAX_BATCH_FRAMES = int(os.environ.get("FACE_MAX_BATCH_FRAMES", 16))
+
 @recognition_bp.route("/recognize", methods=["POST"])
 def recognize_face():
-    data = request.get_json()
-    image_base64 = data.get("image_base64")
+    """
+    Identify one face. Optional scope parameters (class_name, section, role,
+    or timetable=true for the period running now) restrict the first search;
+    the whole gallery is searched only if nothing in scope matches.
+    match_mode: "min" (closest template) or "centroid" (mean of templates).
+
+    Clients that already detected the face can send "cropped": true (the
+    image is the face) and/or "face_box": [top, right, bottom, left] to skip
+    server-side detection.
+    """
+    image, params = get_image_payload("image_base64")
 
-    if not image_base64:
+    if not image:
         return jsonify({"error": "Image is required"}), 400
 
     try:
-        embedding = generate_embedding(image_base64)
+        cropped, face_box = get_face_box(params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        executor = get_executor()
+        client = request_client(params)
+
+        # Near-identical frame from the same client: reuse its embedding / verdict
+        cache = get_frame_cache()
+        cache_key = ("recognize", client, cropped, face_box)
+        fingerprint = cache.fingerprint(image) if client is not None else None
+        hit, embedding = cache.lookup(cache_key, fingerprint)
+        if not hit:
+            try:
+                if cropped:
+                    embedding = executor.run(
+                        generate_embedding_from_crop, image, face_box, "recognition", client=client,
+                    )
+                else:
+                    embedding = executor.run(generate_embedding, image, "recognition", client=client)
+            except FaceQualityError as e:
+                embedding = e   # a badly lit / blurry static scene stays rejected too
+            cache.store(cache_key, fingerprint, embedding)
+
+        if isinstance(embedding, FaceQualityError):
+            return jsonify({"match": False, "message": str(embedding), "reason": embedding.reason}), 200
         if embedding is None:
             return jsonify({"match": False, "message": "No face detected"}), 200
 
         conn = get_db()
         cur = conn.cursor()
 
-        rows = cur.execute("""
-            SELECT person_id, role, embedding
-            FROM face_embeddings
-        """).fetchall()
-
-        best_match = None
-        min_distance = 0.6  # threshold
-
-        for row in rows:
-            db_embedding = np.frombuffer(row["embedding"], dtype=np.float32)
-            dist = np.linalg.norm(embedding - db_embedding)
-
-            if dist < min_distance:
-                min_distance = dist
-                best_match = row
+        index = get_index()
+        index.ensure_loaded(conn)
 
+        scope = scope_from_params(conn, params)
+        best_match = index.search(embedding, threshold=0.6, scope=scope, mode=params.get("match_mode"))
         if not best_match:
             return jsonify({"match": False}), 200
 
         person_id = best_match["person_id"]
         role = best_match["role"]
+        min_distance = best_match["distance"]
 
         if role == "student":
             user = cur.execute(
@@ -58,14 +102,124 @@ def recognize_face():
         if user is None:
             return jsonify({"match": False, "message": "User not found"}), 200
 
+        get_refresher().offer(role, person_id, embedding, min_distance)
+
         return jsonify({
             "match": True,
             "id": user["id"],
             "name": user["name"],
             "role": role,
-            "distance": float(min_distance)
+            "distance": float(min_distance),
+            "scoped": best_match.get("scoped", False)
         })
 
+    except RecognitionUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         print("Recognition error:", e)
         return jsonify({"error": "Recognition failed"}), 500
+
+
+def _lookup_people(cur, matches):
+    """Fetch names for all matched (role, person_id) pairs with one query per role."""
+    people = {}
+    for role, table in (("student", "students"), ("teacher", "teachers")):
+        ids = {m["person_id"] for m in matches if m and m["role"] == role}
+        if not ids:
+            continue
+        placeholders = ",".join("?" * len(ids))
+        rows = cur.execute(
+            f"SELECT id, name FROM {table} WHERE id IN ({placeholders})",
+            tuple(ids)
+        ).fetchall()
+        for row in rows:
+            people[(role, str(row["id"]))] = row
+    return people
+
+
+@recognition_bp.route("/recognize-batch", methods=["POST"])
+def recognize_batch():
+    """
+    Recognize faces in several frames with one request.
+
+    Accepts either JSON { "frames": ["base64", ...] } or a multipart upload
+    with one or more "frames" file parts. Every face found in every frame is
+    matched against the gallery in a single matrix operation. Accepts the
+    same scope and match_mode parameters as /recognize.
+    At most MAX_BATCH_FRAMES frames per request (413 beyond that).
+    """
+    if request.files:
+        frames = [f.stream for f in request.files.getlist("frames")]
+        data = {**request.args.to_dict(), **request.form.to_dict()}
+    else:
+        data = request.get_json(silent=True) or {}
+        frames = data.get("frames") or []
+
+    if not frames or not isinstance(frames, list):
+        return jsonify({"error": "At least one frame is required"}), 400
+    if len(frames) > MAX_BATCH_FRAMES:
+        return jsonify({"error": f"At most {MAX_BATCH_FRAMES} frames per batch"}), 413
+
+    try:
+        executor = get_executor()
+        detections = executor.run(
+            generate_embeddings_batch, frames,
+            client=request_client(data),
+            timeout=executor.timeout * max(1, len(frames) / 4),
+        )
+        flat = [face for faces in detections for face in faces if face["embedding"] is not None]
+
+        conn = get_db()
+        cur = conn.cursor()
+
+        index = get_index()
+        index.ensure_loaded(conn)
+
+        scope = scope_from_params(conn, data)
+        matches = index.search_batch(
+            [face["embedding"] for face in flat],
+            threshold=0.6,
+            scope=scope,
+            mode=data.get("match_mode"),
+        )
+        people = _lookup_people(cur, matches)
+
+        results = []
+        pos = 0
+        for faces in detections:
+            frame_faces = []
+            for face in faces:
+                if face["embedding"] is None:
+                    frame_faces.append({"box": face["box"], "match": False, "reason": face["quality"]})
+                    continue
+
+                match = matches[pos]
+                pos += 1
+
+                user = people.get((match["role"], match["person_id"])) if match else None
+                if user is None:
+                    frame_faces.append({"box": face["box"], "match": False})
+                    continue
+
+                get_refresher().offer(
+                    match["role"], match["person_id"], face["embedding"], match["distance"], box=face["box"]
+                )
+
+                frame_faces.append({
+                    "box": face["box"],
+                    "match": True,
+                    "id": user["id"],
+                    "name": user["name"],
+                    "role": match["role"],
+                    "distance": match["distance"],
+                    "scoped": match.get("scoped", False)
+                })
+            results.append({"faces": frame_faces})
+
+        return jsonify({"frames": results, "count": len(results)})
+
+    except RecognitionUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        print("Batch recognition error:", e)
+        return jsonify({"error": "Recognition failed"}), 500
@@ -6,8 +6,10 @@ from datetime import datetime, date as date_module
 
 try:
     from smart_school_backend.utils.db import get_db
+    from smart_school_backend.utils.presence import get_presence
 except ImportError:
     from utils.db import get_db
+    from utils.presence import get_presence
 
 # Correct blueprint name
 student_attendance_bp = Blueprint("student_attendance", __name__)
@@ -25,6 +27,10 @@ def mark_student_attendance():
 
     if not student_id:
         return jsonify({"error": "student_id is required"}), 400
+    try:
+        student_id = int(student_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "student_id must be an integer"}), 400
 
     db = get_db()
     cur = db.cursor()
@@ -52,6 +58,7 @@ def mark_student_attendance():
             (student_id, class_name, date, status),
         )
         db.commit()
+        get_presence().add("student", student_id, date)
 
     except Exception as e:
         current_app.logger.error("mark_student_attendance error: %s", e)
@@ -1,17 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-import sqlite3
-import os
 
-bp = Blueprint("students", __name__)
+from smart_school_backend.face_engine.index import get_index
+from smart_school_backend.utils.db import get_db
+from smart_school_backend.utils.presence import get_presence
 
-def get_db():
-    db_path = os.path.join(os.path.dirname(__file__), "..", "database", "smart_school.db")
-    db_path = os.path.abspath(db_path)
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
+bp = Blueprint("students", __name__)
 
 
 # ============================================================
@@ -132,6 +126,8 @@ def delete_student(student_id):
         cur.execute("DELETE FROM students WHERE id=?", (student_id,))
         cur.execute("DELETE FROM face_embeddings WHERE person_id=? AND role='student'", (student_id,))
         conn.commit()
+        get_index().remove(student_id, "student")
+        get_presence().discard("student", student_id)
         return jsonify({"message": "Student deleted"}), 200
     except Exception as e:
         print("ERROR delete_student:", e)
@@ -2,6 +2,7 @@ import sqlite3
 from flask import Blueprint, request, jsonify, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from smart_school_backend.utils.db import get_db
+from smart_school_backend.utils.presence import get_presence
 from datetime import datetime, date as date_module
 
 bp = Blueprint("teacher_attendance", __name__)
@@ -39,8 +40,15 @@ def mark_teacher_attendance():
 
     if not teacher_id:
         return jsonify({"error": "teacher_id is required"}), 400
+    try:
+        teacher_id = int(teacher_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "teacher_id must be an integer"}), 400
 
     today = date_module.today().isoformat()
+    if get_presence().is_marked("teacher", teacher_id, today):
+        return jsonify({"message": "Attendance already marked for today"}), 200
+
     db = get_db()
     cur = db.cursor()
 
@@ -54,6 +62,7 @@ def mark_teacher_attendance():
             (teacher_id, today, datetime.now().isoformat()),
         )
         db.commit()
+        get_presence().add("teacher", teacher_id, today)
         
         if cur.rowcount > 0:
             return jsonify({"message": "Attendance marked successfully"}), 201
@@ -2,26 +2,12 @@
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-import sqlite3
-import os
-from flask import current_app
 
-bp = Blueprint("teachers", __name__)
+from smart_school_backend.face_engine.index import get_index
+from smart_school_backend.utils.db import get_db
+from smart_school_backend.utils.presence import get_presence
 
-# ----------------------------------------------------------
-# DB helper
-# ----------------------------------------------------------
-def get_db():
-    try:
-        from smart_school_backend.utils.db import get_db as gdb
-        return gdb()
-    except Exception:
-        db_path = os.path.join(current_app.root_path, "..", "database", "smart_school.db")
-        db_path = os.path.abspath(db_path)
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
+bp = Blueprint("teachers", __name__)
 
 
 # ----------------------------------------------------------
@@ -160,6 +146,8 @@ def delete_teacher(teacher_id):
         cur.execute("DELETE FROM teachers WHERE id=?", (teacher_id,))
         cur.execute("DELETE FROM face_embeddings WHERE person_id=? AND role='teacher'", (teacher_id,))
         db.commit()
+        get_index().remove(teacher_id, "teacher")
+        get_presence().discard("teacher", teacher_id)
         return jsonify({"message": "Teacher deleted"}), 200
     except Exception as e:
         print("ERROR delete_teacher:", e)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compare exact vs IVF (approximate) face search on a synthetic gallery.
+
+Usage:
+    python -m smart_school_backend.scripts.benchmark_ann [gallery_size] [queries]
+
+Prints per-query latency and recall@1 (IVF top-1 == exact top-1) for a few
+nprobe values so FACE_ANN_NPROBE can be tuned for a deployment.
+"""
+import sys
+import tempfile
+import os
+import time
+
+import numpy as np
+
+from smart_school_backend.face_engine.ann import IVFIndex
+from smart_school_backend.face_engine.matcher import sq_distances
+
+
+def synthetic_gallery(n, dim=128, people_per_cluster=200, seed=0):
+    """Clustered unit-ish vectors, roughly like dlib embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.12, size=(max(1, n // people_per_cluster), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=n)
+    return (centers[labels] + rng.normal(0, 0.05, size=(n, dim))).astype(np.float32)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(1)
+
+    matrix = synthetic_gallery(n)
+    norms = np.einsum("ij,ij->i", matrix, matrix)
+    picks = rng.choice(n, n_queries, replace=False)
+    queries = matrix[picks] + rng.normal(0, 0.02, size=(n_queries, matrix.shape[1])).astype(np.float32)
+
+    print(f"Gallery: {n} embeddings, {n_queries} queries")
+
+    start = time.perf_counter()
+    truth = [int(np.argmin(sq_distances(q[None, :], matrix, norms)[0])) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+    print(f"exact          {exact_ms:8.3f} ms/query  recall@1 1.000")
+
+    start = time.perf_counter()
+    index = IVFIndex.train(matrix)
+    assignments = index.assign(matrix)
+    print(f"IVF build      {time.perf_counter() - start:8.2f} s ({index.n_lists} lists)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "face_ivf.npz")
+        index.save(path, assignments)
+        start = time.perf_counter()
+        IVFIndex.load(path)
+        print(f"IVF load       {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+    for nprobe in (1, 4, 8, 16, 32):
+        start = time.perf_counter()
+        hits = 0
+        for q, expected in zip(queries, truth):
+            rows, _ = index.search(q, matrix, assignments, k=1, nprobe=nprobe, matrix_norms=norms)
+            hits += int(rows.size > 0 and rows[0] == expected)
+        ms = (time.perf_counter() - start) * 1000 / n_queries
+        print(f"IVF nprobe={nprobe:<3} {ms:8.3f} ms/query  recall@1 {hits / n_queries:.3f}  ({exact_ms / ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Bulk-enroll student faces from a ZIP archive or a folder of photos named by id_code.
+
+Usage (from the project root):
+    python -m smart_school_backend.scripts.bulk_enroll photos.zip
+    python -m smart_school_backend.scripts.bulk_enroll ./photos --workers 8 --dry-run --report report.json
+"""
+import argparse
+import json
+import sys
+
+from smart_school_backend.face_engine.bulk_enroll import bulk_enroll, DUPLICATE_THRESHOLD
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("source", help="ZIP file or directory of <id_code>.jpg photos")
+    parser.add_argument("--workers", type=int, default=None, help="encoder processes (default: all cores)")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD, help="duplicate face distance")
+    parser.add_argument("--dry-run", action="store_true", help="report only, do not write")
+    parser.add_argument("--report", help="write the full JSON report to this file")
+    args = parser.parse_args()
+
+    def progress(done, total):
+        print(f"\r{done}/{total} photos", end="", file=sys.stderr, flush=True)
+
+    report = bulk_enroll(
+        args.source,
+        workers=args.workers,
+        threshold=args.threshold,
+        progress=progress,
+        dry_run=args.dry_run,
+    )
+    print(file=sys.stderr)
+
+    print(f"Total:    {report['total']}")
+    print(f"Enrolled: {report['enrolled']}")
+    print(f"Updated:  {report['updated']}")
+    print(f"Skipped:  {report['skipped']}")
+    print(f"Time:     {report['seconds']}s")
+    for error in report["errors"][:20]:
+        print(f"  {error['file']}: {error['reason']}")
+    if len(report["errors"]) > 20:
+        print(f"  ... {len(report['errors']) - 20} more")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
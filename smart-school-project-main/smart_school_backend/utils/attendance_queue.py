@@ -0,0 +1,157 @@
+# smart_school_backend/utils/attendance_queue.py
+
+"""
+Write-behind queue for automatically recognised attendance.
+
+Kiosks report the same person many times a minute; writing each event
+straight to SQLite (one SELECT + INSERT + COMMIT per face) causes lock
+contention during the morning rush. Instead, recognition events are
+deduplicated in memory by (role, person_id, date) against the per-day
+presence set (utils/presence.py) and a background thread
+flushes them to student_attendance / teacher_attendance every
+FLUSH_INTERVAL seconds in one transaction using INSERT ... ON CONFLICT DO
+NOTHING. If that transaction fails, the batch is written row by row: rows
+the database refuses (IntegrityError) are logged and dropped, and removed
+from the presence set, so one bad row cannot block later writes.
+
+flush() writes everything pending synchronously (tests, shutdown).
+"""
+
+import atexit
+import sqlite3
+import threading
+from datetime import date, datetime
+
+from smart_school_backend.utils.db import DB_PATH, get_connection
+from smart_school_backend.utils.presence import get_presence
+
+FLUSH_INTERVAL = 0.5  # seconds
+MARKED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"   # local time, same layout as CURRENT_TIMESTAMP
+
+STUDENT_INSERT = """
+    INSERT INTO student_attendance (student_id, class_name, date, status, marked_at)
+    SELECT id, COALESCE(class_name, ''), ?, ?, ? FROM students WHERE id = ?
+    ON CONFLICT(student_id, date) DO NOTHING
+"""
+
+TEACHER_INSERT = """
+    INSERT INTO teacher_attendance (teacher_id, date, status, marked_at)
+    SELECT id, ?, ?, ? FROM teachers WHERE id = ?
+    ON CONFLICT(teacher_id, date) DO NOTHING
+"""
+
+
+class AttendanceQueue:
+    def __init__(self, db_path=DB_PATH, flush_interval=FLUSH_INTERVAL, presence=None):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.presence = presence or get_presence()
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []       # (role, person_id, day, status, marked_at)
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # ---------------------------------------
+    # Producers
+    # ---------------------------------------
+
+    def submit(self, role, person_id, status="present"):
+        """
+        Queue a recognition event for today.
+        Returns True if newly accepted, False if this person was already marked
+        or queued today.
+        """
+        today = date.today().isoformat()
+
+        # Atomic check-and-add: only the first event per person per day is queued
+        if not self.presence.add(role, person_id, today):
+            return False
+
+        with self._lock:
+            self._pending.append((role, int(person_id), today, status, datetime.now().strftime(MARKED_AT_FORMAT)))
+
+        self._ensure_worker()
+        return True
+
+    # ---------------------------------------
+    # Flushing
+    # ---------------------------------------
+
+    def _write(self, conn, events):
+        """Insert events in one transaction."""
+        students = [(day, status, marked_at, pid) for role, pid, day, status, marked_at in events if role == "student"]
+        teachers = [(day, status, marked_at, pid) for role, pid, day, status, marked_at in events if role == "teacher"]
+        with conn:
+            if students:
+                conn.executemany(STUDENT_INSERT, students)
+            if teachers:
+                conn.executemany(TEACHER_INSERT, teachers)
+
+    def flush(self):
+        """Write all pending events in one transaction. Returns the number of events written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            try:
+                conn = get_connection(self.db_path)
+                self._write(conn, batch)
+                return len(batch)
+            except Exception as e:
+                print(f"[ATTENDANCE_QUEUE] Batch flush failed, writing rows one by one: {e}")
+
+            written, retry = 0, []
+            for event in batch:
+                try:
+                    self._write(get_connection(self.db_path), [event])
+                    written += 1
+                except sqlite3.IntegrityError as e:
+                    role, pid, day = event[:3]
+                    print(f"[ATTENDANCE_QUEUE] Dropping {role} {pid} on {day}: {e}")
+                    self.presence.discard(role, pid, day)
+                except Exception:
+                    retry.append(event)
+
+            if retry:
+                print(f"[ATTENDANCE_QUEUE] {len(retry)} events not written, retrying later")
+                with self._lock:
+                    self._pending = retry + self._pending
+            return written
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="attendance-queue", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush whatever is still pending."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+_queue = AttendanceQueue()
+atexit.register(_queue.stop)
+
+
+def get_attendance_queue() -> AttendanceQueue:
+    """Return the process-wide attendance queue."""
+    return _queue
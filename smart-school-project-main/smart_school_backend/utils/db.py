@@ -1,5 +1,7 @@
 import sqlite3
 import os
+import threading
+import time
 from flask import g
 
 # Absolute path to the database inside backend/database/
@@ -12,16 +14,192 @@ DB_PATH = os.path.abspath(DB_PATH)
 # Ensure directory exists
 os.makedirs(DB_DIR, exist_ok=True)
 
+# Connection tuning (override with environment variables)
+BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 10))
+CACHED_STATEMENTS = int(os.environ.get("SQLITE_CACHED_STATEMENTS", 256))
+MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))   # bytes
+CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -64 * 1024))        # negative = KiB
+
+# Request connection pool
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 16))
+POOL_MAX_AGE = float(os.environ.get("SQLITE_POOL_MAX_AGE", 600))          # seconds before recycling
+POOL_HEALTH_CHECK_IDLE = 30.0                                             # ping connections idle longer
+
+_wal_enabled = set()
+_wal_lock = threading.Lock()
+_local = threading.local()
+
+
+def _enable_wal(conn, db_path):
+    """journal_mode=WAL is persistent in the file, so set it once per process."""
+    if db_path in _wal_enabled:
+        return
+    with _wal_lock:
+        if db_path not in _wal_enabled:
+            conn.execute("PRAGMA journal_mode = WAL")
+            _wal_enabled.add(db_path)
+
+
+def connect(db_path=DB_PATH):
+    """
+    Open a tuned SQLite connection. WAL lets dashboard readers run alongside
+    kiosk writers; synchronous=NORMAL is durable under WAL without an fsync
+    per commit.
+    """
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    conn.row_factory = sqlite3.Row
+    _enable_wal(conn, db_path)
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = {CACHE_SIZE}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def get_connection(db_path=DB_PATH):
+    """
+    Long-lived connection for the calling thread, for code that runs outside
+    a request (models, background workers). Do not close it.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = connect(db_path)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Bounded pool of tuned connections shared by request threads.
+
+    acquire() hands out the most recently returned idle connection (LIFO keeps
+    a busy thread on a warm connection), opens a new one while under
+    max_size, and otherwise waits for a release. Connections older than
+    max_age are recycled; ones idle longer than POOL_HEALTH_CHECK_IDLE are
+    pinged first and replaced if broken.
+    """
+
+    def __init__(self, db_path=DB_PATH, max_size=POOL_SIZE, max_age=POOL_MAX_AGE, wait_timeout=BUSY_TIMEOUT):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.wait_timeout = wait_timeout
+
+        self._cond = threading.Condition()
+        self._idle = []      # [(conn, created_at, returned_at)]
+        self._created = {}   # conn -> created_at, for connections handed out
+        self._size = 0
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "recycled": 0, "discarded": 0}
+
+    def _healthy(self, conn, created_at, returned_at, now):
+        if now - created_at > self.max_age:
+            self._stats["recycled"] += 1
+            return False
+        if now - returned_at > POOL_HEALTH_CHECK_IDLE:
+            try:
+                conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error:
+                self._stats["discarded"] += 1
+                return False
+        return True
+
+    def acquire(self):
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    conn, created_at, returned_at = self._idle.pop()
+                    if self._healthy(conn, created_at, returned_at, now):
+                        self._stats["hits"] += 1
+                        self._created[conn] = created_at
+                        return conn
+                    self._size -= 1
+                    conn.close()
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._stats["misses"] += 1
+                    break
+
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                remaining = deadline - now
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise sqlite3.OperationalError("Database connection pool exhausted")
+
+        # Open outside the lock; connecting may block on WAL setup
+        try:
+            conn = connect(self.db_path)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created[conn] = time.monotonic()
+        return conn
+
+    def release(self, conn):
+        with self._cond:
+            created_at = self._created.pop(conn, None)
+        if created_at is None:
+            conn.close()
+            return
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            reusable = True
+        except sqlite3.Error:
+            reusable = False
+
+        with self._cond:
+            if reusable:
+                self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                self._size -= 1
+                self._stats["discarded"] += 1
+                conn.close()
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            }
+
+
+_pool = ConnectionPool()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the request connection pool (for monitoring / tests)."""
+    return _pool
+
 
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False)
-        g.db.row_factory = sqlite3.Row
-        g.db.execute("PRAGMA foreign_keys = ON")
+        g.db = _pool.acquire()
     return g.db
 
 
 def close_db(e=None):
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        _pool.release(db)
@@ -0,0 +1,61 @@
+# smart_school_backend/utils/image_input.py
+
+"""
+Read a frame from a face endpoint request in any of the supported shapes:
+
+- raw body:   Content-Type image/jpeg | image/png | application/octet-stream,
+              extra parameters in the query string (?tolerance=0.5&role=student)
+- multipart:  file part named `file_field`, extra parameters as form fields
+- JSON:       base64 string (optionally a data URL) under `json_field`
+
+Binary uploads skip the base64 round trip entirely: the bytes (or the
+uploaded file stream) go straight to PIL.
+"""
+
+from flask import request
+
+RAW_IMAGE_MIMETYPES = {"image/jpeg", "image/png", "image/webp", "application/octet-stream"}
+
+
+def get_image_payload(json_field, file_field="image"):
+    """
+    Returns (image, params):
+      image  - raw bytes, a readable file stream, a base64 string, or None
+      params - dict of the remaining request parameters
+    """
+    if request.mimetype in RAW_IMAGE_MIMETYPES:
+        return request.get_data(cache=False) or None, request.args.to_dict()
+
+    if request.files:
+        params = request.args.to_dict()
+        params.update(request.form.to_dict())
+        upload = request.files.get(file_field) or request.files.get(json_field)
+        return (upload.stream if upload else None), params
+
+    data = request.get_json(silent=True) or {}
+    return data.get(json_field), data
+
+
+def get_face_box(params):
+    """
+    Client-supplied face location for the crop fast path.
+    Returns (cropped, box): cropped is True when the client says it already
+    found the face ("cropped": true or a "face_box"); box is
+    (top, right, bottom, left) or None for "the whole image is the face".
+    face_box may be a JSON list or a "top,right,bottom,left" string.
+    Raises ValueError for a malformed box.
+    """
+    box = params.get("face_box")
+    cropped = str(params.get("cropped", "")).lower() in ("1", "true", "yes")
+    if box in (None, ""):
+        return cropped, None
+
+    if isinstance(box, str):
+        box = box.split(",")
+    try:
+        top, right, bottom, left = (int(float(v)) for v in box)
+    except (TypeError, ValueError):
+        raise ValueError("face_box must be [top, right, bottom, left]")
+    if bottom <= top or right <= left:
+        raise ValueError("face_box must be [top, right, bottom, left]")
+    return True, (top, right, bottom, left)
@@ -0,0 +1,101 @@
+# smart_school_backend/utils/jobs.py
+
+"""
+Short-lived asynchronous request jobs.
+
+A route that would otherwise block until recognition and the DB write
+finish can submit the work here and answer 202 with a job id right away.
+The job runs on a small thread pool inside a Flask app context (so get_db()
+works), and its (body, status) result is kept for JOB_TTL seconds after it
+finishes. Clients poll get() or stream wait() as server-sent events.
+
+Finished and expired jobs are purged lazily on every submit/get.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_TTL = float(os.environ.get("JOB_TTL", 120))            # seconds a finished result is kept
+JOB_THREADS = int(os.environ.get("JOB_THREADS", 8))
+MAX_JOBS = int(os.environ.get("JOB_MAX", 1000))            # pending + cached results
+
+
+class JobStore:
+    def __init__(self, ttl=JOB_TTL, threads=JOB_THREADS, max_jobs=MAX_JOBS):
+        self.ttl = ttl
+        self.threads = threads
+        self.max_jobs = max_jobs
+
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._pool = None
+
+    def _purge(self, now):
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished"] is not None and now - job["finished"] > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, app, fn, *args):
+        """
+        Run fn(*args) -> (body dict, http status) in the background inside
+        app's context. Returns the job id, or None if too many jobs are held.
+        """
+        now = time.monotonic()
+        with self._cond:
+            self._purge(now)
+            if len(self._jobs) >= self.max_jobs:
+                return None
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {"status": "pending", "result": None, "http_status": None,
+                                  "created": now, "finished": None}
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="job")
+            pool = self._pool
+
+        def run():
+            try:
+                with app.app_context():
+                    body, status = fn(*args)
+            except Exception as e:
+                print(f"[JOBS] Job {job_id} failed: {e}")
+                body, status = {"success": False, "error": "Internal server error"}, 500
+            with self._cond:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    job.update(status="done", result=body, http_status=status, finished=time.monotonic())
+                self._cond.notify_all()
+
+        pool.submit(run)
+        return job_id
+
+    def get(self, job_id):
+        """Snapshot of a job, or None if unknown / expired."""
+        with self._cond:
+            self._purge(time.monotonic())
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait(self, job_id, timeout):
+        """Block until the job is done or timeout passes; returns get(job_id)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] == "done" or remaining <= 0:
+                    return dict(job) if job else None
+                self._cond.wait(remaining)
+
+
+_store = JobStore()
+
+
+def get_job_store() -> JobStore:
+    """Return the process-wide job store."""
+    return _store
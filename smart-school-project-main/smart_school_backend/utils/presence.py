@@ -0,0 +1,85 @@
+# smart_school_backend/utils/presence.py
+
+"""
+Per-day in-memory set of people who already have an attendance row.
+
+Kiosks ask "is this student already marked today?" many times a minute for
+the same person. The first question for a date loads every student_id /
+teacher_id for that date from student_attendance / teacher_attendance in
+one query each; after that, answers come from memory and every successful
+insert adds to the set. Only today's set is kept, so it rolls over by
+itself at midnight.
+"""
+
+import threading
+from datetime import date
+
+from smart_school_backend.utils.db import DB_PATH, get_connection
+
+TABLES = {
+    "student": ("student_attendance", "student_id"),
+    "teacher": ("teacher_attendance", "teacher_id"),
+}
+
+
+class PresenceRegistry:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._day = None
+        self._present = {}   # role -> set of person ids for self._day
+
+    def _load(self, day):
+        present = {}
+        conn = get_connection(self.db_path)
+        for role, (table, column) in TABLES.items():
+            rows = conn.execute(f"SELECT {column} FROM {table} WHERE date = ?", (day,)).fetchall()
+            present[role] = {int(r[0]) for r in rows if r[0] is not None}
+        return present
+
+    def _ensure_day(self, day):
+        """Load `day` if it is not the cached date. Caller holds self._lock."""
+        if self._day != day:
+            self._present = self._load(day)
+            self._day = day
+
+    def is_marked(self, role, person_id, day=None):
+        day = day or date.today().isoformat()
+        with self._lock:
+            self._ensure_day(day)
+            return int(person_id) in self._present.get(role, ())
+
+    def add(self, role, person_id, day=None):
+        """
+        Record a successful insert. Returns True if the person was not marked yet.
+        Dates other than the cached one are ignored (they load fresh on demand).
+        """
+        day = day or date.today().isoformat()
+        with self._lock:
+            if day != date.today().isoformat() and day != self._day:
+                return True
+            self._ensure_day(day)
+            people = self._present.setdefault(role, set())
+            if int(person_id) in people:
+                return False
+            people.add(int(person_id))
+            return True
+
+    def discard(self, role, person_id, day=None):
+        day = day or date.today().isoformat()
+        with self._lock:
+            if day == self._day:
+                self._present.get(role, set()).discard(int(person_id))
+
+    def invalidate(self):
+        with self._lock:
+            self._day = None
+            self._present = {}
+
+
+_registry = PresenceRegistry()
+
+
+def get_presence() -> PresenceRegistry:
+    """Return the process-wide presence registry."""
+    return _registry